@@ -0,0 +1,66 @@
+import sys
+import time
+import datetime
+
+import dateutil.parser
+import numpy as np
+
+from connectors.models import bitmex_model
+from connectors.models.bitmex_model import BITMEX_TF_MINUTES, iso_to_ms, iso_to_ms_array, ms_to_iso
+
+# Open times of BitMEX bucketed candles: the former per-object dateutil path, the per-row iso_to_ms() and the
+# vectorized iso_to_ms_array() with the timeframe shift done on the int64 array.
+# Run from the TradingBotCourse folder:
+#   python -m benchmarks.bench_bitmex_timestamps [rows] [timeframe]
+
+
+def dateutil_path(rows, timeframe: str):
+    # what bitmex_model.Candle.__init__ does for every row
+    result = []
+    for row in rows:
+        timestamp = dateutil.parser.isoparse(row['timestamp'])
+        timestamp = timestamp - datetime.timedelta(minutes=BITMEX_TF_MINUTES[timeframe])
+        result.append(int(timestamp.timestamp() * 1000))
+    return result
+
+
+def per_row_path(rows, timeframe: str):
+    tf_ms = BITMEX_TF_MINUTES[timeframe] * 60 * 1000
+    return [iso_to_ms(row['timestamp']) - tf_ms for row in rows]
+
+
+def vectorized_path(rows, timeframe: str):
+    return iso_to_ms_array([row['timestamp'] for row in rows]) - BITMEX_TF_MINUTES[timeframe] * 60 * 1000
+
+
+def best_of(function, rows, timeframe: str, repeat: int = 5):
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(rows, timeframe)
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed), result
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    timeframe = sys.argv[2] if len(sys.argv) > 2 else "1m"
+
+    start = 1600000000000
+    tf_ms = BITMEX_TF_MINUTES[timeframe] * 60 * 1000
+    rows = [{'timestamp': ms_to_iso(start + (i + 1) * tf_ms), 'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0,
+             'volume': 1} for i in range(count)]
+
+    reference = None
+    for name, function in [("dateutil isoparse + timedelta", dateutil_path), ("iso_to_ms per row", per_row_path),
+                           ("iso_to_ms_array", vectorized_path)]:
+        elapsed, result = best_of(function, rows, timeframe)
+        result = np.asarray(result, dtype=np.int64)
+        if reference is None:
+            reference = result
+
+        print(f"{name:<32} {count} rows, {elapsed * 1000:8.1f} ms, {elapsed / count * 1e9:6.0f} ns/row, "
+              f"same result: {np.array_equal(result, reference)}")
+
+    elapsed, _ = best_of(bitmex_model.Candle.series_from_rows, rows, timeframe)
+    print(f"{'Candle.series_from_rows':<32} {count} rows, {elapsed * 1000:8.1f} ms")
@@ -0,0 +1,62 @@
+import sys
+import json
+import time
+import random
+
+from connectors import codec
+
+# Compares the stdlib json decoder with the codec used by the connectors (orjson/ujson when installed).
+# Run from the TradingBotCourse folder:
+#   python -m benchmarks.bench_codec [recorded_frames.jsonl]
+# The optional file holds one raw websocket frame or REST body per line, synthetic payloads are used otherwise.
+
+
+def synthetic_payloads():
+    book_ticker = json.dumps({"e": "bookTicker", "u": 400900217, "E": 1568014460893, "T": 1568014460891, "s": "BTCUSDT",
+                              "b": "25.35190000", "B": "31.21000000", "a": "25.36520000", "A": "40.66000000"})
+
+    symbols = []
+    for i in range(300):
+        symbols.append({"symbol": f"SYM{i}USDT", "pair": f"SYM{i}USDT", "contractType": "PERPETUAL", "status": "TRADING",
+                        "baseAsset": f"SYM{i}", "quoteAsset": "USDT", "pricePrecision": random.randint(1, 6),
+                        "quantityPrecision": random.randint(0, 3), "orderTypes": ["LIMIT", "MARKET", "STOP", "TAKE_PROFIT"],
+                        "filters": [{"filterType": "PRICE_FILTER", "minPrice": "0.01", "maxPrice": "1000000", "tickSize": "0.01"},
+                                    {"filterType": "LOT_SIZE", "minQty": "0.001", "maxQty": "1000", "stepSize": "0.001"}]})
+    exchange_info = json.dumps({"timezone": "UTC", "serverTime": 1565246363776, "symbols": symbols})
+
+    instruments = json.dumps({"table": "instrument", "action": "partial", "keys": ["symbol"],
+                              "data": [{"symbol": f"XBT{i}", "bidPrice": 9000.5 + i, "askPrice": 9001.0 + i,
+                                        "tickSize": 0.5, "lotSize": 100, "rootSymbol": "XBT", "quoteCurrency": "USD",
+                                        "timestamp": "2022-01-01T00:00:00.000Z"} for i in range(200)]})
+
+    return {"bookTicker": [book_ticker] * 20000, "exchangeInfo": [exchange_info] * 20, "instrument partial": [instruments] * 50}
+
+
+def recorded_payloads(path: str):
+    with open(path) as f:
+        frames = [line.rstrip("\n") for line in f if line.strip()]
+
+    return {path: frames}
+
+
+def bench(decoder, frames) -> float:
+    start = time.perf_counter()
+    for frame in frames:
+        decoder(frame)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    payloads = recorded_payloads(sys.argv[1]) if len(sys.argv) > 1 else synthetic_payloads()
+
+    print(f"codec in use: {codec.CODEC_NAME}")
+
+    for name, frames in payloads.items():
+        frames_bytes = [f.encode() for f in frames]
+
+        stdlib_time = bench(json.loads, frames)
+        codec_time = bench(codec.loads, frames)
+        codec_bytes_time = bench(codec.loads, frames_bytes)
+
+        print(f"{name}: {len(frames)} payloads, json {stdlib_time * 1000:.1f} ms, {codec.CODEC_NAME} str {codec_time * 1000:.1f} ms, "
+              f"{codec.CODEC_NAME} bytes {codec_bytes_time * 1000:.1f} ms, speedup x{stdlib_time / codec_time:.2f}")
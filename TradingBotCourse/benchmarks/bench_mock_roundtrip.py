@@ -0,0 +1,68 @@
+import sys
+import time
+import logging
+
+import numpy as np
+
+from benchmarks.mock_exchange import MockBinance, MockBitmex
+from connectors.binance_futures import BinanceFuturesClient
+from connectors.bitmex import BitmexClient
+
+# Order round trip and quote latency of both clients against the local mock exchange, without any network.
+# Run from the TradingBotCourse folder:
+#   python -m benchmarks.bench_mock_roundtrip [orders] [extra REST latency in seconds]
+
+
+def percentiles(values_ms) -> str:
+    p50, p90, p99 = np.percentile(values_ms, [50, 90, 99])
+    return f"p50 {p50:.2f} ms, p90 {p90:.2f} ms, p99 {p99:.2f} ms"
+
+
+def bench_binance(orders: int, latency: float):
+    mock = MockBinance(latency=latency, stream_rate=50).start()
+    client = BinanceFuturesClient(mock.api_key, mock.api_secret, True, base_url=mock.base_url, wss_url=mock.wss_url,
+                                  user_data_stream=False)
+    contract = client.contracts['BTCUSDT']
+
+    round_trips = []
+    for _ in range(orders):
+        start = time.perf_counter()
+        order_status = client.place_order(contract, "BUY", 0.01, "LIMIT", 100, "GTC")
+        client.cancel_order(contract, order_status.order_id)
+        round_trips.append((time.perf_counter() - start) * 1000)
+
+    time.sleep(2)
+    print(f"Binance place + cancel: {percentiles(round_trips)}")
+    print(f"Binance quotes: {client.get_latency_metrics()}")
+
+    mock.stop()
+
+
+def bench_bitmex(orders: int, latency: float):
+    mock = MockBitmex(latency=latency, stream_rate=50).start()
+    client = BitmexClient(mock.api_key, mock.api_secret, True, base_url=mock.base_url, wss_url=mock.wss_url)
+    contract = client.contracts['XBTUSD']
+
+    round_trips = []
+    for _ in range(orders):
+        start = time.perf_counter()
+        order_status = client.place_order(contract, "limit", 100, "buy", 9000, "GoodTillCancel")
+        client.cancel_order(order_status.order_id)
+        round_trips.append((time.perf_counter() - start) * 1000)
+
+    time.sleep(2)
+    print(f"Bitmex place + cancel: {percentiles(round_trips)}")
+    print(f"Bitmex quotes: {client.get_latency_metrics()}")
+
+    mock.stop()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.ERROR)
+
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+
+    bench_binance(orders, latency)
+    # the client side BitMEX limiter allows 120 requests per minute, more orders would measure its waits
+    bench_bitmex(min(orders, 50), latency)
@@ -0,0 +1,91 @@
+import gc
+import sys
+import time
+import random
+import datetime
+import tracemalloc
+
+import dateutil.parser
+
+from connectors.models import binance_model, bitmex_model
+
+# Memory and construction time of the slotted models and the columnar CandleSeries against the former dict-backed
+# classes.
+# Run from the TradingBotCourse folder:
+#   python -m benchmarks.bench_models [contracts] [candles per contract]
+# The default reproduces a 1000 candle download for 200 contracts, 200k candles.
+
+
+class DictBinanceCandle:
+    # the former binance_model.Candle, without __slots__
+    def __init__(self, candle_info, timeframe):
+        self.timestamp = candle_info[0]
+        self.open = float(candle_info[1])
+        self.high = float(candle_info[2])
+        self.low = float(candle_info[3])
+        self.close = float(candle_info[4])
+        self.volume = float(candle_info[5])
+
+
+class DictBitmexCandle:
+    # the former bitmex_model.Candle, without __slots__
+    def __init__(self, candle_info, timeframe):
+        self.timestamp = dateutil.parser.isoparse(candle_info['timestamp'])
+        self.timestamp = self.timestamp - datetime.timedelta(minutes=bitmex_model.BITMEX_TF_MINUTES[timeframe])
+        self.timestamp = int(self.timestamp.timestamp() * 1000)
+        self.open = float(candle_info['open'])
+        self.high = float(candle_info['high'])
+        self.low = float(candle_info['low'])
+        self.close = float(candle_info['close'])
+        self.volume = float(candle_info['volume'])
+
+
+def binance_rows(count: int):
+    start = 1600000000000
+    return [[start + i * 60000, f"{random.uniform(100, 200):.2f}", f"{random.uniform(100, 200):.2f}",
+             f"{random.uniform(100, 200):.2f}", f"{random.uniform(100, 200):.2f}", f"{random.uniform(0, 1000):.3f}",
+             start + i * 60000 + 59999, "0", 100, "0", "0", "0"] for i in range(count)]
+
+
+def bitmex_rows(count: int):
+    start = 1600000000000
+    return [{'timestamp': bitmex_model.ms_to_iso(start + i * 60000), 'symbol': "XBTUSD", 'open': random.uniform(100, 200),
+             'high': random.uniform(100, 200), 'low': random.uniform(100, 200), 'close': random.uniform(100, 200),
+             'volume': random.randint(0, 100000)} for i in range(count)]
+
+
+def measure(name: str, build, pages):
+    # timed without tracing first, tracemalloc slows every allocation down
+    gc.collect()
+    start = time.perf_counter()
+    result = [build(rows) for rows in pages]
+    elapsed = time.perf_counter() - start
+    del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = [build(rows) for rows in pages]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    count = sum(len(r) for r in result)
+    print(f"{name:<40} {count} candles, {elapsed * 1000:8.1f} ms, retained {current / 1e6:7.1f} MB "
+          f"({current / count:5.0f} B/candle), peak {peak / 1e6:7.1f} MB")
+
+    return result
+
+
+if __name__ == '__main__':
+    contracts = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    candles = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    # the raw rows are allocated before tracing starts, only the model objects are measured
+    pages = [binance_rows(candles) for _ in range(contracts)]
+    measure("binance dict-backed Candle(row)", lambda rows: [DictBinanceCandle(r, "1m") for r in rows], pages)
+    measure("binance slotted Candle(row)", lambda rows: [binance_model.Candle(r, "1m") for r in rows], pages)
+    measure("binance Candle.series_from_rows()", lambda rows: binance_model.Candle.series_from_rows(rows), pages)
+
+    pages = [bitmex_rows(candles) for _ in range(max(contracts // 10, 1))]
+    measure("bitmex dict-backed Candle(row)", lambda rows: [DictBitmexCandle(r, "1m") for r in rows], pages)
+    measure("bitmex slotted Candle(row)", lambda rows: [bitmex_model.Candle(r, "1m") for r in rows], pages)
+    measure("bitmex Candle.series_from_rows()", lambda rows: bitmex_model.Candle.series_from_rows(rows, "1m"), pages)
@@ -0,0 +1,774 @@
+import sys
+import time
+import json
+import uuid
+import hmac
+import random
+import struct
+import base64
+import socket
+import typing
+import hashlib
+import argparse
+import datetime
+import threading
+import collections
+
+from abc import ABC, abstractmethod
+
+from decimal import Decimal
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+from connectors.models.binance_model import BINANCE_TF_MINUTES
+from connectors.models.bitmex_model import BITMEX_TF_MINUTES
+
+# Local stand-in for the Binance Futures and BitMEX APIs used by the connectors: REST endpoints with signature
+# verification and rate limit headers, and a websocket endpoint streaming synthetic bookTicker / instrument updates.
+# Latency and errors can be injected. Run from the TradingBotCourse folder:
+#   python -m benchmarks.mock_exchange binance --port 8001 --rate 20 --latency 0.005 --error-rate 0.01
+# then create the client with the printed urls:
+#   BinanceFuturesClient("mock_key", "mock_secret", True, base_url="http://127.0.0.1:8001", wss_url="ws://127.0.0.1:8001/ws")
+# or start it from a benchmark with MockBinance(...).start(), which picks a free port when port is 0.
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+WS_OP_TEXT = 0x1
+WS_OP_CLOSE = 0x8
+WS_OP_PING = 0x9
+WS_OP_PONG = 0xA
+
+
+# Server side of an RFC 6455 connection, enough for the websocket-client and aiohttp clients: unfragmented
+# text frames, ping/pong and close. Frames from the client are masked, the ones sent by the server are not.
+class MockWebsocket:
+    def __init__(self, rfile, sock: socket.socket):
+        self._rfile = rfile
+        self._sock = sock
+        self._send_lock = threading.Lock()
+        self.closed = False
+        self.frames_sent = 0
+
+    def send_text(self, text: str):
+        self.send_frame(WS_OP_TEXT, text.encode())
+
+    def send_frame(self, opcode: int, payload: bytes):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+
+        with self._send_lock:
+            if self.closed:
+                return
+            try:
+                self._sock.sendall(header + payload)
+                self.frames_sent += 1
+            except OSError:
+                self.closed = True
+
+    def receive(self):
+        # returns (opcode, payload) or None once the connection is gone
+        header = self._rfile.read(2)
+        if len(header) < 2:
+            return None
+
+        opcode = header[0] & 0x0F
+        masked = header[1] & 0x80
+        length = header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self._rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._rfile.read(8))[0]
+
+        mask = self._rfile.read(4) if masked else None
+        payload = self._rfile.read(length)
+        if len(payload) < length:
+            return None
+
+        if mask is not None:
+            # xor the whole payload at once with the mask repeated over its length
+            key = int.from_bytes((mask * (length // 4 + 1))[:length], "big")
+            payload = (int.from_bytes(payload, "big") ^ key).to_bytes(length, "big")
+
+        return opcode, payload
+
+    def close(self):
+        self.send_frame(WS_OP_CLOSE, struct.pack("!H", 1000))
+        self.closed = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body are separate writes, delayed ACKs would add 40 ms per request
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.headers.get('Upgrade', "").lower() == "websocket":
+            self.server.exchange.handle_websocket(self)
+        else:
+            self.server.exchange.handle_rest(self, "GET")
+
+    def do_POST(self):
+        self.server.exchange.handle_rest(self, "POST")
+
+    def do_PUT(self):
+        self.server.exchange.handle_rest(self, "PUT")
+
+    def do_DELETE(self):
+        self.server.exchange.handle_rest(self, "DELETE")
+
+
+class MockExchange(ABC):
+    def __init__(self, api_key: str = "mock_key", api_secret: str = "mock_secret", host: str = "127.0.0.1", port: int = 0,
+                 symbols=None, latency: float = 0.0, latency_jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, stream_rate: float = 10.0, verify_signatures: bool = True):
+        self.api_key = api_key
+        self.api_secret = api_secret
+
+        self.latency = latency  # seconds added before every REST response
+        self.latency_jitter = latency_jitter  # random extra latency between 0 and this value
+        self.error_rate = error_rate  # share of the REST requests answered with error_status
+        self.error_status = error_status
+        self.stream_rate = stream_rate  # updates per second and per symbol on the websocket
+        self.verify_signatures = verify_signatures
+
+        self.symbols = list(symbols) if symbols is not None else self.DEFAULT_SYMBOLS
+        self._mids = {symbol: 100.0 * (i + 1) for i, symbol in enumerate(self.symbols)}
+        self._lock = threading.Lock()
+
+        self.orders = dict()  # order id -> order as returned by the API
+        self._request_times = collections.deque()  # for the rate limit headers
+
+        self._stats = collections.Counter()
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.exchange = self
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self._server.server_address[0]}:{self.port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def metrics(self) -> typing.Dict:
+        return dict(self._stats)
+
+    # market simulation
+
+    def mid_price(self, symbol: str) -> float:
+        with self._lock:
+            mid = self._mids[symbol] * (1 + random.gauss(0, 0.0002))
+            self._mids[symbol] = mid
+        return mid
+
+    def quote(self, symbol: str, tick: float) -> typing.Tuple[float, float, float, float]:
+        mid = self.mid_price(symbol)
+        bid = round(int(mid / tick) * tick, 8)
+        return bid, round(bid + tick, 8), round(random.uniform(1, 50), 3), round(random.uniform(1, 50), 3)
+
+    # REST
+
+    def handle_rest(self, handler: BaseHTTPRequestHandler, method: str):
+        self._stats['requests'] += 1
+
+        url = urlsplit(handler.path)
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        length = int(handler.headers.get('Content-Length', 0))
+        body = handler.rfile.read(length).decode() if length > 0 else ""
+
+        delay = self.latency + random.uniform(0, self.latency_jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        now = time.time()
+        self._request_times.append(now)
+        while self._request_times and self._request_times[0] < now - 60:
+            self._request_times.popleft()
+
+        if random.random() < self.error_rate:
+            self._stats['injected_errors'] += 1
+            status, response = self.error_status, self.error_body("Injected error")
+        else:
+            route = self.routes().get((method, url.path))
+            if route is None:
+                status, response = 404, self.error_body(f"Unknown endpoint {method} {url.path}")
+            elif not self.check_auth(handler, method, url, params, body):
+                self._stats['auth_errors'] += 1
+                status, response = 401, self.error_body("Signature for this request is not valid.")
+            else:
+                try:
+                    status, response = route(params)
+                except Exception as e:
+                    status, response = 400, self.error_body(f"Bad request: {e}")
+
+        data = json.dumps(response).encode()
+
+        handler.send_response(status)
+        handler.send_header('Content-Type', "application/json")
+        handler.send_header('Content-Length', str(len(data)))
+        for name, value in self.rate_limit_headers(method, url.path).items():
+            handler.send_header(name, value)
+        if status == 429:
+            handler.send_header('Retry-After', "1")
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _sign(self, message: str) -> str:
+        return hmac.new(self.api_secret.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+    @abstractmethod
+    def routes(self) -> typing.Dict:
+        ...
+
+    @abstractmethod
+    def check_auth(self, handler, method: str, url, params: typing.Dict, body: str) -> bool:
+        ...
+
+    @abstractmethod
+    def error_body(self, message: str):
+        ...
+
+    @abstractmethod
+    def rate_limit_headers(self, method: str, path: str) -> typing.Dict[str, str]:
+        ...
+
+    # websocket
+
+    def handle_websocket(self, handler: BaseHTTPRequestHandler):
+        key = handler.headers['Sec-WebSocket-Key']
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+
+        handler.send_response(101)
+        handler.send_header('Upgrade', "websocket")
+        handler.send_header('Connection', "Upgrade")
+        handler.send_header('Sec-WebSocket-Accept', accept)
+        handler.end_headers()
+        handler.wfile.flush()
+        handler.close_connection = True
+
+        ws = MockWebsocket(handler.rfile, handler.connection)
+        session = self.new_ws_session(ws, urlsplit(handler.path).path)
+        self._stats['ws_connections'] += 1
+
+        streamer = threading.Thread(target=self._stream, args=(ws, session), daemon=True)
+        streamer.start()
+
+        while not ws.closed:
+            frame = ws.receive()
+            if frame is None:
+                break
+
+            opcode, payload = frame
+            if opcode == WS_OP_TEXT:
+                self.on_ws_message(ws, session, payload.decode())
+            elif opcode == WS_OP_PING:
+                ws.send_frame(WS_OP_PONG, payload)
+            elif opcode == WS_OP_CLOSE:
+                ws.close()
+
+        ws.closed = True
+        self._stats['ws_frames_sent'] += ws.frames_sent
+
+    def _stream(self, ws: MockWebsocket, session: typing.Dict):
+        interval = 1 / self.stream_rate if self.stream_rate > 0 else None
+        next_time = time.time()
+
+        while not ws.closed and interval is not None:
+            self.stream_tick(ws, session)
+
+            next_time += interval
+            time.sleep(max(next_time - time.time(), 0))
+
+    def new_ws_session(self, ws: MockWebsocket, path: str) -> typing.Dict:
+        return {'path': path, 'topics': set()}
+
+    @abstractmethod
+    def on_ws_message(self, ws: MockWebsocket, session: typing.Dict, msg: str):
+        ...
+
+    @abstractmethod
+    def stream_tick(self, ws: MockWebsocket, session: typing.Dict):
+        ...
+
+
+class MockBinance(MockExchange):
+    DEFAULT_SYMBOLS = ["BTCUSDT", "ETHUSDT", "BNBUSDT", "XRPUSDT", "ADAUSDT"]
+    PRICE_PRECISION = 2
+    QUANTITY_PRECISION = 3
+    # like BTCUSDT the tick is coarser than pricePrecision, only the filters give the valid prices
+    TICK_SIZE = "0.10"
+    STEP_SIZE = "0.001"
+
+    # endpoints that need a valid signature, the others only need the API key or nothing
+    SIGNED = {"/fapi/v1/account", "/fapi/v1/order", "/fapi/v1/openOrders", "/fapi/v1/batchOrders", "/fapi/v1/allOpenOrders"}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._next_order_id = 1
+        self._update_id = 1
+
+    @property
+    def wss_url(self) -> str:
+        return f"ws://{self._server.server_address[0]}:{self.port}/ws"
+
+    def routes(self) -> typing.Dict:
+        return {
+            ("GET", "/fapi/v1/ping"): lambda p: (200, dict()),
+            ("GET", "/fapi/v1/exchangeInfo"): self._exchange_info,
+            ("GET", "/fapi/v1/account"): self._account,
+            ("GET", "/fapi/v1/klines"): self._klines,
+            ("GET", "/fapi/v1/ticker/bookTicker"): self._book_ticker,
+            ("GET", "/fapi/v1/depth"): self._depth,
+            ("GET", "/fapi/v1/order"): self._get_order,
+            ("POST", "/fapi/v1/order"): self._place_order,
+            ("DELETE", "/fapi/v1/order"): self._cancel_order,
+            ("GET", "/fapi/v1/openOrders"): self._open_orders,
+            ("POST", "/fapi/v1/batchOrders"): self._place_batch,
+            ("DELETE", "/fapi/v1/batchOrders"): self._cancel_batch,
+            ("DELETE", "/fapi/v1/allOpenOrders"): self._cancel_all,
+            ("POST", "/fapi/v1/listenKey"): lambda p: (200, {'listenKey': "mocklistenkey"}),
+            ("PUT", "/fapi/v1/listenKey"): lambda p: (200, dict()),
+            ("DELETE", "/fapi/v1/listenKey"): lambda p: (200, dict()),
+        }
+
+    def check_auth(self, handler, method: str, url, params: typing.Dict, body: str) -> bool:
+        if url.path not in self.SIGNED and url.path != "/fapi/v1/listenKey":
+            return True
+
+        if handler.headers.get('X-MBX-APIKEY') != self.api_key:
+            return False
+
+        if url.path not in self.SIGNED or not self.verify_signatures:
+            return True
+
+        # the signature covers the query string that precedes it
+        query, sep, signature = url.query.rpartition("&signature=")
+        return sep != "" and 'timestamp' in params and hmac.compare_digest(self._sign(query), signature)
+
+    def error_body(self, message: str):
+        return {'code': -1000, 'msg': message}
+
+    def rate_limit_headers(self, method: str, path: str) -> typing.Dict[str, str]:
+        return {'X-MBX-USED-WEIGHT-1M': str(len(self._request_times))}
+
+    def _tick(self) -> float:
+        return float(self.TICK_SIZE)
+
+    def _exchange_info(self, params):
+        filters = [{'filterType': "PRICE_FILTER", 'minPrice': self.TICK_SIZE, 'maxPrice': "1000000", 'tickSize': self.TICK_SIZE},
+                   {'filterType': "LOT_SIZE", 'minQty': self.STEP_SIZE, 'maxQty': "1000", 'stepSize': self.STEP_SIZE}]
+        symbols = [{'symbol': s, 'pair': s, 'contractType': "PERPETUAL", 'status': "TRADING", 'baseAsset': s[:-4],
+                    'quoteAsset': "USDT", 'pricePrecision': self.PRICE_PRECISION, 'quantityPrecision': self.QUANTITY_PRECISION,
+                    'filters': filters}
+                   for s in self.symbols]
+        return 200, {'timezone': "UTC", 'serverTime': int(time.time() * 1000), 'symbols': symbols}
+
+    def _account(self, params):
+        asset = {'asset': "USDT", 'initialMargin': "0.00000000", 'maintMargin': "0.00000000", 'marginBalance': "10000.00000000",
+                 'walletBalance': "10000.00000000", 'unrealizedProfit': "0.00000000"}
+        return 200, {'assets': [asset]}
+
+    def _klines(self, params):
+        tf_ms = BINANCE_TF_MINUTES[params['interval']] * 60 * 1000
+        limit = int(params.get('limit', 500))
+        now = int(time.time() * 1000)
+
+        end = int(params.get('endTime', now))
+        start = int(params['startTime']) if 'startTime' in params else end - (limit - 1) * tf_ms
+        start -= start % tf_ms
+
+        rows = []
+        rng = random.Random(f"{params['symbol']}{start}")
+        price = self._mids[params['symbol']]
+        open_time = start
+        while open_time <= min(end, now) and len(rows) < limit:
+            high, low = price * (1 + rng.random() * 0.002), price * (1 - rng.random() * 0.002)
+            close = rng.uniform(low, high)
+            rows.append([open_time, f"{price:.2f}", f"{high:.2f}", f"{low:.2f}", f"{close:.2f}", f"{rng.uniform(1, 1000):.3f}",
+                         open_time + tf_ms - 1, "0", 100, "0", "0", "0"])
+            price = close
+            open_time += tf_ms
+
+        return 200, rows
+
+    def _ticker(self, symbol: str):
+        bid, ask, bid_qty, ask_qty = self.quote(symbol, self._tick())
+        return {'symbol': symbol, 'bidPrice': str(bid), 'bidQty': str(bid_qty), 'askPrice': str(ask), 'askQty': str(ask_qty),
+                'time': int(time.time() * 1000)}
+
+    def _book_ticker(self, params):
+        if 'symbol' in params:
+            return 200, self._ticker(params['symbol'])
+        return 200, [self._ticker(s) for s in self.symbols]
+
+    def _depth(self, params):
+        limit = int(params.get('limit', 100))
+        tick = self._tick()
+        bid, ask = self.quote(params['symbol'], tick)[:2]
+
+        self._update_id += 1
+        now = int(time.time() * 1000)
+        return 200, {'lastUpdateId': self._update_id, 'E': now, 'T': now,
+                     'bids': [[f"{bid - i * tick:.2f}", f"{random.uniform(1, 50):.3f}"] for i in range(limit)],
+                     'asks': [[f"{ask + i * tick:.2f}", f"{random.uniform(1, 50):.3f}"] for i in range(limit)]}
+
+    def _new_order(self, order: typing.Dict) -> typing.Dict:
+        with self._lock:
+            order_id = self._next_order_id
+            self._next_order_id += 1
+
+        filled = order['type'] == "MARKET"
+        order_status = {'orderId': order_id, 'symbol': order['symbol'], 'side': order['side'], 'type': order['type'],
+                        'origQty': order['quantity'], 'price': order.get('price', "0"),
+                        'status': "FILLED" if filled else "NEW",
+                        'avgPrice': f"{self._mids[order['symbol']]:.2f}" if filled else "0.00000",
+                        'updateTime': int(time.time() * 1000)}
+        self.orders[order_id] = order_status
+
+        return order_status
+
+    def _cancel(self, order_id: int):
+        order_status = self.orders.get(order_id)
+        if order_status is None:
+            return None
+
+        if order_status['status'] == "NEW":
+            order_status['status'] = "CANCELED"
+        return order_status
+
+    def _get_order(self, params):
+        order_status = self.orders.get(int(params['orderId']))
+        if order_status is None:
+            return 400, {'code': -2013, 'msg': "Order does not exist."}
+        return 200, order_status
+
+    def _order_error(self, order: typing.Dict):
+        # the checks of the exchange filters, None when the order is valid
+        if order['symbol'] not in self._mids:
+            return {'code': -1121, 'msg': "Invalid symbol."}
+        if order.get('price') is not None and Decimal(str(order['price'])) % Decimal(self.TICK_SIZE) != 0:
+            return {'code': -4014, 'msg': "Price not increased by tick size."}
+        if Decimal(str(order['quantity'])) % Decimal(self.STEP_SIZE) != 0:
+            return {'code': -1111, 'msg': "Precision is over the maximum defined for this asset."}
+        return None
+
+    def _place_order(self, params):
+        error = self._order_error(params)
+        if error is not None:
+            return 400, error
+        return 200, self._new_order(params)
+
+    def _cancel_order(self, params):
+        order_status = self._cancel(int(params['orderId']))
+        if order_status is None:
+            return 400, {'code': -2011, 'msg': "Unknown order sent."}
+        return 200, order_status
+
+    def _open_orders(self, params):
+        return 200, [o for o in self.orders.values() if o['status'] == "NEW" and params.get('symbol', o['symbol']) == o['symbol']]
+
+    def _place_batch(self, params):
+        return 200, [self._order_error(o) or self._new_order(o) for o in json.loads(params['batchOrders'])]
+
+    def _cancel_batch(self, params):
+        results = []
+        for order_id in json.loads(params['orderIdList']):
+            order_status = self._cancel(order_id)
+            results.append(order_status if order_status is not None else {'code': -2011, 'msg': "Unknown order sent."})
+        return 200, results
+
+    def _cancel_all(self, params):
+        for o in self.orders.values():
+            if o['symbol'] == params['symbol'] and o['status'] == "NEW":
+                o['status'] = "CANCELED"
+        return 200, {'code': 200, 'msg': "The operation of cancel all open order is done."}
+
+    def on_ws_message(self, ws: MockWebsocket, session: typing.Dict, msg: str):
+        data = json.loads(msg)
+
+        if data.get('method') == "SUBSCRIBE":
+            session['topics'].update(data['params'])
+        elif data.get('method') == "UNSUBSCRIBE":
+            session['topics'].difference_update(data['params'])
+
+        ws.send_text(json.dumps({'result': None, 'id': data.get('id')}))
+
+    def stream_tick(self, ws: MockWebsocket, session: typing.Dict):
+        # the user data stream (/ws/<listenKey>) stays quiet, market connections get one bookTicker per symbol
+        tick = self._tick()
+
+        for topic in list(session['topics']):
+            symbol, _, channel = topic.partition("@")
+            symbol = symbol.upper()
+            if channel != "bookTicker" or symbol not in self._mids:
+                continue
+
+            bid, ask, bid_qty, ask_qty = self.quote(symbol, tick)
+            now = int(time.time() * 1000)
+            self._update_id += 1
+            ws.send_text(json.dumps({'e': "bookTicker", 'u': self._update_id, 'E': now, 'T': now, 's': symbol,
+                                     'b': str(bid), 'B': str(bid_qty), 'a': str(ask), 'A': str(ask_qty)}))
+
+
+class MockBitmex(MockExchange):
+    DEFAULT_SYMBOLS = ["XBTUSD", "ETHUSD", "XRPUSD", "LTCUSD", "BCHUSD"]
+    TICK_SIZE = 0.5
+    LOT_SIZE = 100
+
+    @property
+    def wss_url(self) -> str:
+        return f"ws://{self._server.server_address[0]}:{self.port}/realtime"
+
+    def routes(self) -> typing.Dict:
+        return {
+            ("GET", "/api/v1"): lambda p: (200, {'name': "BitMEX API (mock)"}),
+            ("GET", "/api/v1/instrument/active"): lambda p: (200, [self._instrument(s) for s in self.symbols]),
+            ("GET", "/api/v1/user/margin"): self._margin,
+            ("GET", "/api/v1/trade/bucketed"): self._bucketed,
+            ("GET", "/api/v1/order"): self._get_orders,
+            ("POST", "/api/v1/order"): self._place_order,
+            ("DELETE", "/api/v1/order"): self._cancel_orders,
+            ("POST", "/api/v1/order/bulk"): self._place_bulk,
+            ("DELETE", "/api/v1/order/all"): self._cancel_all,
+        }
+
+    def check_auth(self, handler, method: str, url, params: typing.Dict, body: str) -> bool:
+        public = url.path in ("/api/v1", "/api/v1/instrument/active", "/api/v1/trade/bucketed")
+        if 'api-signature' not in handler.headers:
+            return public
+
+        if handler.headers.get('api-key') != self.api_key or int(handler.headers.get('api-expires', 0)) < time.time():
+            return False
+
+        if not self.verify_signatures:
+            return True
+
+        # method + path with the query string + expires + body
+        message = f"{method}{handler.path}{handler.headers['api-expires']}{body}"
+        return hmac.compare_digest(self._sign(message), handler.headers['api-signature'])
+
+    def error_body(self, message: str):
+        return {'error': {'message': message, 'name': "HTTPError"}}
+
+    def rate_limit_headers(self, method: str, path: str) -> typing.Dict[str, str]:
+        now = time.time()
+        headers = {'x-ratelimit-limit': "120", 'x-ratelimit-remaining': str(max(120 - len(self._request_times), 0)),
+                   'x-ratelimit-reset': str(int(now) + 60)}
+        if method in ("POST", "DELETE") and path.startswith("/api/v1/order"):
+            headers['x-ratelimit-remaining-1s'] = "9"
+        return headers
+
+    @staticmethod
+    def _iso(timestamp_ms: int) -> str:
+        return datetime.datetime.utcfromtimestamp(timestamp_ms / 1000).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+    def _instrument(self, symbol: str) -> typing.Dict:
+        bid, ask = self.quote(symbol, self.TICK_SIZE)[:2]
+        return {'symbol': symbol, 'rootSymbol': symbol[:3], 'quoteCurrency': "USD", 'state': "Open", 'tickSize': self.TICK_SIZE,
+                'lotSize': self.LOT_SIZE, 'bidPrice': bid, 'askPrice': ask, 'timestamp': self._iso(int(time.time() * 1000))}
+
+    def _margin(self, params):
+        return 200, [{'account': 1, 'currency': "XBt", 'initMargin': 0, 'maintMargin': 0, 'marginBalance': 100000000,
+                      'walletBalance': 100000000, 'unrealisedPnl': 0}]
+
+    def _bucketed(self, params):
+        # BitMEX timestamps a bucket with its close time
+        tf_ms = BITMEX_TF_MINUTES[params['binSize']] * 60 * 1000
+        count = int(params.get('count', 100))
+        now = int(time.time() * 1000)
+
+        def parse(iso: str) -> int:
+            return int(datetime.datetime.fromisoformat(iso.replace("Z", "+00:00")).timestamp() * 1000)
+
+        end = parse(params['endTime']) if 'endTime' in params else now
+        start = parse(params['startTime']) if 'startTime' in params else end - (count - 1) * tf_ms
+        start += -start % tf_ms
+
+        rows = []
+        rng = random.Random(f"{params['symbol']}{start}")
+        price = self._mids[params['symbol']]
+        close_time = start
+        while close_time <= min(end, now) and len(rows) < count:
+            high, low = price * (1 + rng.random() * 0.002), price * (1 - rng.random() * 0.002)
+            close = rng.uniform(low, high)
+            rows.append({'timestamp': self._iso(close_time), 'symbol': params['symbol'], 'open': price, 'high': high,
+                         'low': low, 'close': close, 'trades': 100, 'volume': rng.randint(100, 100000)})
+            price = close
+            close_time += tf_ms
+
+        if params.get('reverse') in ("true", "True"):
+            rows.reverse()
+
+        return 200, rows
+
+    def _new_order(self, order: typing.Dict) -> typing.Dict:
+        order_type = order.get('ordType', order.get('type', "Limit"))
+        filled = order_type == "Market"
+        order_status = {'orderID': str(uuid.uuid4()), 'symbol': order['symbol'], 'side': order['side'], 'ordType': order_type,
+                        'orderQty': float(order['orderQty']), 'price': float(order['price']) if 'price' in order else None,
+                        'ordStatus': "Filled" if filled else "New", 'avgPx': self._mids[order['symbol']] if filled else None,
+                        'timestamp': self._iso(int(time.time() * 1000))}
+        self.orders[order_status['orderID']] = order_status
+
+        return order_status
+
+    def _get_orders(self, params):
+        orders = [o for o in self.orders.values() if params.get('symbol', o['symbol']) == o['symbol']]
+        if params.get('reverse') in ("true", "True"):
+            orders.reverse()
+        return 200, orders
+
+    def _place_order(self, params):
+        if params.get('symbol') not in self._mids:
+            return 400, self.error_body("Invalid symbol")
+        return 200, self._new_order(params)
+
+    def _place_bulk(self, params):
+        return 200, [self._new_order(o) for o in json.loads(params['orders'])]
+
+    def _cancel_orders(self, params):
+        order_ids = params['orderID']
+        order_ids = json.loads(order_ids) if order_ids.startswith("[") else [order_ids]
+
+        cancelled = []
+        for order_id in order_ids:
+            order_status = self.orders.get(order_id)
+            if order_status is not None:
+                if order_status['ordStatus'] == "New":
+                    order_status['ordStatus'] = "Canceled"
+                cancelled.append(order_status)
+
+        if len(cancelled) == 0:
+            return 404, self.error_body("Not Found")
+        return 200, cancelled
+
+    def _cancel_all(self, params):
+        cancelled = []
+        for o in self.orders.values():
+            if o['symbol'] == params.get('symbol', o['symbol']) and o['ordStatus'] == "New":
+                o['ordStatus'] = "Canceled"
+                cancelled.append(o)
+        return 200, cancelled
+
+    def new_ws_session(self, ws: MockWebsocket, path: str) -> typing.Dict:
+        session = super().new_ws_session(ws, path)
+        session['authenticated'] = False
+        ws.send_text(json.dumps({'info': "Welcome to the BitMEX Realtime API (mock).", 'version': "mock",
+                                 'timestamp': self._iso(int(time.time() * 1000))}))
+        return session
+
+    def on_ws_message(self, ws: MockWebsocket, session: typing.Dict, msg: str):
+        if msg == "ping":
+            ws.send_text("pong")
+            return
+
+        data = json.loads(msg)
+        op, args = data.get('op'), data.get('args', [])
+
+        if op == "authKeyExpires":
+            api_key, expires, signature = args
+            valid = api_key == self.api_key and expires >= time.time() and \
+                (not self.verify_signatures or hmac.compare_digest(self._sign(f"GET/realtime{expires}"), signature))
+            session['authenticated'] = valid
+            response = {'success': True, 'request': data} if valid else {'status': 401, 'error': "Signature not valid.", 'request': data}
+            ws.send_text(json.dumps(response))
+
+        elif op == "subscribe":
+            for topic in args:
+                table = topic.split(":")[0]
+                if table in ("order", "execution", "margin", "position") and not session['authenticated']:
+                    ws.send_text(json.dumps({'status': 401, 'error': "User requested an account-locked subscription but no authorization was provided.", 'request': data}))
+                    continue
+
+                session['topics'].add(topic)
+                ws.send_text(json.dumps({'success': True, 'subscribe': topic, 'request': data}))
+                ws.send_text(json.dumps(self._partial(topic)))
+
+        elif op == "unsubscribe":
+            for topic in args:
+                session['topics'].discard(topic)
+                ws.send_text(json.dumps({'success': True, 'unsubscribe': topic, 'request': data}))
+
+    def _partial(self, topic: str) -> typing.Dict:
+        # like BitMEX, the partial of a per-symbol topic carries a filter on that symbol
+        table, _, symbol = topic.partition(":")
+        partial_filter = {'symbol': symbol} if symbol else {}
+
+        if table == "instrument":
+            rows = [self._instrument(s) for s in self.symbols if symbol in ("", s)]
+            return {'table': "instrument", 'action': "partial", 'keys': ["symbol"], 'filter': partial_filter, 'data': rows}
+
+        keys = {'order': ["orderID"], 'execution': ["execID"], 'margin': ["account", "currency"],
+                'position': ["account", "symbol", "currency"]}.get(table, [])
+        return {'table': table, 'action': "partial", 'keys': keys, 'filter': partial_filter, 'data': []}
+
+    def stream_tick(self, ws: MockWebsocket, session: typing.Dict):
+        symbols = set()
+        for topic in list(session['topics']):
+            table, _, symbol = topic.partition(":")
+            if table == "instrument":
+                symbols.update(self.symbols if symbol == "" else [symbol])
+
+        rows = []
+        for symbol in symbols:
+            if symbol in self._mids:
+                bid, ask = self.quote(symbol, self.TICK_SIZE)[:2]
+                rows.append({'symbol': symbol, 'bidPrice': bid, 'askPrice': ask, 'timestamp': self._iso(int(time.time() * 1000))})
+
+        if len(rows) > 0:
+            ws.send_text(json.dumps({'table': "instrument", 'action': "update", 'data': rows}))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local mock of the Binance Futures / BitMEX APIs")
+    parser.add_argument("exchange", choices=["binance", "bitmex"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--api-key", default="mock_key")
+    parser.add_argument("--api-secret", default="mock_secret")
+    parser.add_argument("--symbols", type=int, default=None, help="number of synthetic symbols")
+    parser.add_argument("--rate", type=float, default=10.0, help="stream updates per second and per symbol")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every REST response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+
+    mock_class = MockBinance if args.exchange == "binance" else MockBitmex
+    symbols = None
+    if args.symbols is not None:
+        symbols = [f"SYM{i}USDT" if args.exchange == "binance" else f"SYM{i}USD" for i in range(args.symbols)]
+
+    mock = mock_class(args.api_key, args.api_secret, args.host, args.port, symbols=symbols, latency=args.latency,
+                      latency_jitter=args.jitter, error_rate=args.error_rate, error_status=args.error_status,
+                      stream_rate=args.rate).start()
+
+    print(f"{args.exchange} mock listening: base_url={mock.base_url} wss_url={mock.wss_url}")
+
+    try:
+        while True:
+            time.sleep(10)
+            print(mock.metrics())
+    except KeyboardInterrupt:
+        mock.stop()
+        sys.exit(0)
@@ -1,25 +1,38 @@
 import logging
-import requests
 import time
 import typing
+import threading
 
 from urllib.parse import urlencode
 
 import hmac
 import hashlib
 
-import websocket
-import json
-
-import threading
-
+from concurrent.futures import ThreadPoolExecutor
+
+from connectors import codec
+from connectors.http_session import PooledSession
+from connectors.binance_user_stream import BinanceUserDataStream
+from connectors.binance_ws_manager import BinanceStreamManager
+from connectors.subscriptions import SubscriptionRegistry
+from connectors.latency import LatencyMonitor
+from connectors.price_board import PriceBoard, PricesView
+from connectors.candle_builder import CandleBuilder, CandleClock
+from connectors.candle_series import CandleSeries
+from connectors.order_book import OrderBook, BinanceBookSync
+from connectors.ingest import IngestPipeline, field_value, OVERFLOW_BLOCK
+from connectors.rate_limiter import BinanceRateLimiter, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
 from connectors.models.binance_model import *
 
 logger = logging.getLogger()
 
 # https://binance-docs.github.io/apidocs/futures/en/#market-data-endpoints
 class BinanceFuturesClient:
-    def __init__(self, api_key: str, api_secret: str, testnet: bool):
+    def __init__(self, api_key: str, api_secret: str, testnet: bool, pool_size: int = 10, max_idle: float = 60.0,
+                 history_workers: int = 5, user_data_stream: bool = True, ws_shards: int = 2,
+                 subscribe_all_contracts: bool = True, ingest_workers: int = 1, ingest_queue_size: int = 10000,
+                 ingest_overflow: str = OVERFLOW_BLOCK, recorder=None,
+                 base_url=None, wss_url=None):
         if testnet:
             self._base_url = "https://testnet.binancefuture.com"
             self._wss_url = "wss://fstream.binancefuture.com/ws"
@@ -27,21 +40,71 @@ class BinanceFuturesClient:
             self._base_url = "https://fapi.binance.com"
             self._wss_url = "wss://fstream.binance.com/ws"
 
+        # a local mock exchange (benchmarks/mock_exchange.py) or a proxy can replace the exchange urls
+        if base_url is not None:
+            self._base_url = base_url
+        if wss_url is not None:
+            self._wss_url = wss_url
+
         self._api_key = api_key
         self._api_secret = api_secret
 
         self._headers = {"X-MBX-APIKEY": self._api_key}
 
-        self.contracts = self.get_contracts()
-        self.balances = self.get_balances()
+        self._history_workers = history_workers  # parallel requests used to download long candle histories
 
-        self.prices = dict()
+        self._rate_limiter = BinanceRateLimiter()
 
-        self._ws_id = 1
-        self._ws = None
+        # shared by every REST call, warmed up with a few parallel pings
+        self._session = PooledSession(self._base_url, pool_size=pool_size, max_idle=max_idle)
+        self._session.warm_up(lambda: self._make_request("GET", "/fapi/v1/ping", dict()), connections=min(pool_size, 4))
 
-        t = threading.Thread(target=self._start_ws)
-        t.start()
+        # unrealized PnL of every open position, (symbol, position side) -> (margin asset, PnL), summed into the balances
+        self._position_pnl = dict()
+
+        self.contracts = self.get_contracts()
+        self.balances = self.get_balances()
+
+        # top of book of every symbol in fixed array slots, prices keeps the former dict interface on top of it
+        self.price_board = PriceBoard(self.contracts.keys())
+        self.prices = PricesView(self.price_board)
+
+        # exchange, receive and dispatch times of the quote updates, see is_quote_fresh()
+        self.latency = LatencyMonitor("Binance")
+
+        # kept up to date by the user data stream, order id -> latest OrderStatus. Open orders stay until they are
+        # finished, only the last BINANCE_MAX_CACHED_FINAL_ORDERS finished ones are kept.
+        self.orders = dict()
+        self._final_orders = dict()  # ids of the cached finished orders, oldest first
+        self._orders_lock = threading.Lock()
+
+        # full depth books maintained from the diff streams, symbol -> OrderBook
+        self.order_books = dict()
+        self._book_syncs = dict()
+
+        # live candles built from the trade streams, symbol -> list of CandleBuilder
+        self._candle_builders = dict()
+        self._candle_clock = CandleClock()
+
+        # optional TapeRecorder receiving every raw market data frame
+        self._recorder = recorder
+        self._replaying = False
+
+        # websocket frames are decoded by worker threads, frames of one symbol always go to the same worker
+        self._ingest = IngestPipeline("Binance", self._process_message, lambda msg: field_value(msg, "s"),
+                                      ingest_workers, ingest_queue_size, ingest_overflow)
+
+        # market streams are spread over several websocket connections, and only subscribed while a consumer needs them
+        self._subscriptions = SubscriptionRegistry()
+        self._ws_manager = BinanceStreamManager(self._wss_url, self._on_message, shards=ws_shards,
+                                                on_reconnect=self._resync_streams)
+        if subscribe_all_contracts:
+            self.subscribe(list(self.contracts.values()), "bookTicker", "all_contracts")
+
+        self._user_stream = BinanceUserDataStream(self, self._wss_url, self._on_user_event,
+                                                  on_reconnect=self._resync_account)
+        if user_data_stream:
+            self._user_stream.start()
            
         logger.info("Binance Futures Client successfully initialized")
 
@@ -50,35 +113,38 @@ class BinanceFuturesClient:
         return hmac.new(self._api_secret.encode(), urlencode(data).encode(), hashlib.sha256).hexdigest()
 
 
-    def _make_request(self, method: str, endpoint: str, data: typing.Dict):
-        if method == "GET":
-            try:
-                response = requests.get(f"{self._base_url}{endpoint}", params=data, headers=self._headers)
-            except Exception as e:
-                logger.error(f"Connection error while making {method} request to {endpoint}: {e}")
-                return None
-        elif method == "POST":
-            try:
-                response = requests.post(f"{self._base_url}{endpoint}", params=data, headers=self._headers)
-            except Exception as e:
-                logger.error(f"Connection error while making {method} request to {endpoint}: {e}")
-                return None
-        elif method == "DELETE":
-            try:
-                response = requests.delete(f"{self._base_url}{endpoint}", params=data, headers=self._headers)
-            except Exception as e:
-                logger.error(f"Connection error while making {method} request to {endpoint}: {e}")
-                return None
-        else:
+    def _make_request(self, method: str, endpoint: str, data: typing.Dict, priority: int = PRIORITY_NORMAL,
+                      signed: bool = False):
+        if method not in ("GET", "POST", "PUT", "DELETE"):
             raise ValueError()
 
+        self._rate_limiter.acquire(method, endpoint, data, priority)
+
+        # stamped and signed once the limiter lets the request go, a request that waited for its weight would
+        # otherwise be outside of recvWindow (-1021)
+        if signed:
+            data['timestamp'] = int(time.time() * 1000)
+            data['signature'] = self._generate_signature(data)
+
+        try:
+            response = self._session.request(method, endpoint, params=data, headers=self._headers)
+        except Exception as e:
+            logger.error(f"Connection error while making {method} request to {endpoint}: {e}")
+            return None
+
+        self._rate_limiter.update_from_headers(response.status_code, response.headers)
+
         if response.status_code == 200:
-            return response.json()
+            return codec.loads(response.content)
         else:
-            logger.error(f"Error while making {method} request to {endpoint}: {response.json()} (error code {response.status_code}")
+            logger.error(f"Error while making {method} request to {endpoint}: {codec.loads(response.content)} (error code {response.status_code}")
             return None
 
 
+    def get_rate_limit_usage(self) -> typing.Dict:
+        return self._rate_limiter.metrics()
+
+
     def get_contracts(self) -> typing.Dict[str, Contract]:
         enchange_info = self._make_request("GET", "/fapi/v1/exchangeInfo", dict())
 
@@ -92,21 +158,28 @@ class BinanceFuturesClient:
 
     def get_balances(self) -> typing.Dict[str, Balance]:
         data = dict()
-        data['timestamp'] = int(time.time() * 1000)
-        data['signature'] = self._generate_signature(data)
 
         balances = dict()
 
-        account_data = self._make_request("GET", "/fapi/v1/account", data)
+        account_data = self._make_request("GET", "/fapi/v1/account", data, signed=True)
 
         if account_data is not None:
             for a in account_data['assets']:
                 balances[a['asset']] = Balance(a)
+
+            self._position_pnl.clear()
+            for p in account_data.get('positions', []):
+                if p['symbol'] in self.contracts:
+                    self._position_pnl[(p['symbol'], p.get('positionSide', "BOTH"))] = \
+                        (self.contracts[p['symbol']].quote_asset, float(p['unrealizedProfit']))
         
         return balances
 
 
-    def get_historical_candles(self, contract: Contract, interval: str) -> typing.List[Candle]:
+    def get_historical_candles(self, contract: Contract, interval: str, start_time=None, end_time=None) -> CandleSeries:
+        if start_time is not None:
+            return self._get_historical_candles_range(contract, interval, start_time, end_time)
+
         data = dict()
         data['symbol'] = contract.symbol
         data['interval'] = interval
@@ -114,12 +187,58 @@ class BinanceFuturesClient:
 
         raw_candles = self._make_request("GET", "/fapi/v1/klines", data)
 
-        candles = []
-        if raw_candles is not None:
-            for c in raw_candles:
-                candles.append(Candle(c, interval))
+        if raw_candles is None:
+            return Candle.series_from_rows([])
+
+        return Candle.series_from_rows(raw_candles)
+
+
+    def _get_historical_candles_range(self, contract: Contract, interval: str, start_time: int, end_time=None) -> CandleSeries:
+        # start_time and end_time are Unix timestamps in milliseconds, the range is split into windows of
+        # 1000 candles (the klines maximum) that are downloaded in parallel and merged back in order
+        if end_time is None:
+            end_time = int(time.time() * 1000)
+
+        if interval == "1M":
+            window_ms = end_time - start_time + 1  # 1000 monthly candles are more than 80 years, one window is enough
+        elif interval in BINANCE_TF_MINUTES:
+            window_ms = 1000 * BINANCE_TF_MINUTES[interval] * 60 * 1000
+        else:
+            logger.error(f"Unknown Binance candle interval: {interval}")
+            return Candle.series_from_rows([])
+
+        windows = []
+        window_start = start_time
+        while window_start <= end_time:
+            windows.append((window_start, min(window_start + window_ms - 1, end_time)))
+            window_start += window_ms
+
+        with ThreadPoolExecutor(max_workers=self._history_workers) as executor:
+            pages = executor.map(lambda w: self._get_candles_window(contract, interval, w[0], w[1]), windows)
 
-        return candles
+            raw_candles = dict()
+            for page in pages:
+                for c in page:
+                    raw_candles[c[0]] = c  # windows can overlap on the edges, keep one candle per timestamp
+
+        return Candle.series_from_rows([raw_candles[ts] for ts in sorted(raw_candles)])
+
+
+    def _get_candles_window(self, contract: Contract, interval: str, start_time: int, end_time: int) -> typing.List:
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['interval'] = interval
+        data['startTime'] = start_time
+        data['endTime'] = end_time
+        data['limit'] = 1000
+
+        raw_candles = self._make_request("GET", "/fapi/v1/klines", data, PRIORITY_LOW)
+
+        if raw_candles is None:
+            logger.warning(f"Missing {contract.symbol} {interval} candles between {start_time} and {end_time}")
+            return []
+
+        return raw_candles
 
 
     def get_bid_ask(self, contract: Contract) -> typing.Dict[str, float]:
@@ -129,31 +248,79 @@ class BinanceFuturesClient:
         ob_data = self._make_request("GET", "/fapi/v1/ticker/bookTicker", data)
 
         if ob_data is not None:
-            if contract.symbol not in self.prices:
-                self.prices[contract.symbol] = {'bid': float(ob_data['bidPrice']), 'ask': float(ob_data['askPrice'])}
-            else:
-                self.prices[contract.symbol]['bid'] = float(ob_data['bidPrice'])
-                self.prices[contract.symbol]['ask'] = float(ob_data['askPrice'])
+            self.price_board.update(contract.symbol, float(ob_data['bidPrice']), float(ob_data['askPrice']),
+                                    float(ob_data['bidQty']), float(ob_data['askQty']), ob_data['time'])
+            self.latency.record(contract.symbol, ob_data['time'], time.time())
 
             return self.prices[contract.symbol]
 
 
+    def get_all_bid_ask(self):
+        # top of book of every symbol in one request, used to fill the gaps left by a websocket reconnection
+        ob_data = self._make_request("GET", "/fapi/v1/ticker/bookTicker", dict())
+
+        if ob_data is not None:
+            receive_time = time.time()
+            for t in ob_data:
+                if t['symbol'] in self.price_board:
+                    self.price_board.update(t['symbol'], float(t['bidPrice']), float(t['askPrice']),
+                                            float(t['bidQty']), float(t['askQty']), t['time'])
+                    self.latency.record(t['symbol'], t['time'], receive_time)
+
+        return ob_data
+
+
     def get_order_status(self, contract: Contract, order_id: int) -> OrderStatus:
+        # orders seen by the user data stream are always current, no need to ask the exchange
+        if self._user_stream.connected and order_id in self.orders:
+            return self.orders[order_id]
+
         data = dict()
         data['symbol'] = contract.symbol
         data['orderId'] = order_id
-        data['timestamp'] = int(time.time() * 1000)
-        data['signature'] = self._generate_signature(data)
 
-        order_status = self._make_request("GET", "/fapi/v1/order", data)
+        order_status = self._make_request("GET", "/fapi/v1/order", data, signed=True)
 
         if order_status is not None:
-            order_status = OrderStatus(order_status)
+            order_status = self._store_order(OrderStatus(order_status), replace=True)
 
         return order_status
 
 
-    def place_order(self, contract: Contract, side: str, quantity: float, order_type: str, price=None, tif=None) -> OrderStatus:
+    def _store_order(self, order_status: OrderStatus, replace: bool = False) -> OrderStatus:
+        # replace=False for new orders: a stream update can arrive before the REST response, it is newer and is kept.
+        # Queries and cancellations return the current state, which replaces the cached one.
+        with self._orders_lock:
+            if not replace and order_status.order_id in self.orders:
+                return self.orders[order_status.order_id]
+
+            order_id = order_status.order_id
+            self.orders[order_id] = order_status
+
+            if order_status.status in BINANCE_FINAL_ORDER_STATUSES:
+                self._final_orders.pop(order_id, None)
+                self._final_orders[order_id] = None
+                if len(self._final_orders) > BINANCE_MAX_CACHED_FINAL_ORDERS:
+                    oldest = next(iter(self._final_orders))
+                    del self._final_orders[oldest]
+                    self.orders.pop(oldest, None)
+
+            return order_status
+
+
+    def place_order(self, contract: Contract, side: str, quantity: float, order_type: str, price=None, tif=None,
+                    normalize: bool = False) -> OrderStatus:
+        if normalize:
+            # snapped to the contract's tick and lot sizes and sent as exact decimal strings, the exchange would
+            # reject a price or quantity that is not a multiple of them
+            if contract.round_quantity(quantity) == 0:
+                logger.warning(f"{contract.symbol} order quantity {quantity} is smaller than the lot size {contract.lot_size}")
+                return None
+
+            quantity = contract.format_quantity(quantity)
+            if price is not None:
+                price = contract.format_price(price)
+
         data = dict()
         data['symbol'] = contract.symbol
         data['side'] = side
@@ -163,13 +330,11 @@ class BinanceFuturesClient:
             data['price'] = price
         if tif is not None:
             data['timeInForce'] = tif
-        data['timestamp'] = int(time.time() * 1000)
-        data['signature'] = self._generate_signature(data)
 
-        order_status = self._make_request("POST", "/fapi/v1/order", data)
+        order_status = self._make_request("POST", "/fapi/v1/order", data, PRIORITY_HIGH, signed=True)
 
         if order_status is not None:
-            order_status = OrderStatus(order_status)
+            order_status = self._store_order(OrderStatus(order_status))
 
         return order_status
 
@@ -178,10 +343,8 @@ class BinanceFuturesClient:
         data = dict()
         data['symbol'] = contract.symbol
         data['orderId'] = order_id
-        data['timestamp'] = int(time.time() * 1000)
-        data['signature'] = self._generate_signature(data)
 
-        order_status = self._make_request("DELETE", "/fapi/v1/order", data)
+        order_status = self._make_request("DELETE", "/fapi/v1/order", data, PRIORITY_HIGH, signed=True)
 
         if order_status is not None:
             order_status = OrderStatus(order_status)
@@ -189,57 +352,307 @@ class BinanceFuturesClient:
         return order_status
 
 
-    def _start_ws(self):
-        self._ws = websocket.WebSocketApp(self._wss_url, on_open=self._on_open, on_close=self._on_close, on_error=self._on_error, on_message=self._on_message)
+    def place_batch_orders(self, orders: typing.List[typing.Dict]) -> typing.List[OrderStatus]:
+        # each order is a dict with the place_order arguments: contract, side, quantity, order_type, price, tif
+        # returns one OrderStatus per order in submission order, None for the orders that were rejected
+        statuses = []
+
+        for i in range(0, len(orders), BINANCE_MAX_BATCH_ORDERS):
+            chunk = orders[i:i + BINANCE_MAX_BATCH_ORDERS]
+
+            batch = []
+            for order in chunk:
+                order_data = dict()
+                order_data['symbol'] = order['contract'].symbol
+                order_data['side'] = order['side']
+                order_data['quantity'] = str(order['quantity'])
+                order_data['type'] = order['order_type']
+                if order.get('price') is not None:
+                    order_data['price'] = str(order['price'])
+                if order.get('tif') is not None:
+                    order_data['timeInForce'] = order['tif']
+                batch.append(order_data)
 
-        while True:
-            try:
-                self._ws.run_forever()
-            except Exception as e:
-                logger.error(f"Binance error in run_forever() method: {e}")
-            time.sleep(2) # just to give time to connection to restart instead of keep asking at every clock
+            data = dict()
+            data['batchOrders'] = codec.dumps(batch)
 
+            response = self._make_request("POST", "/fapi/v1/batchOrders", data, PRIORITY_HIGH, signed=True)
+            statuses.extend(self._parse_batch_response(response, len(chunk)))
 
-    def _on_open(self, ws):
-        logger.info("Binance websocket connection opened")
+        return statuses
 
-        self.subscribe_channel(list(self.contracts.values()), "bookTicker")
 
+    def cancel_batch_orders(self, contract: Contract, order_ids: typing.List[int]) -> typing.List[OrderStatus]:
+        statuses = []
 
-    def _on_close(self, ws):
-        logger.warning("Binance websocket connection closed")
+        for i in range(0, len(order_ids), BINANCE_MAX_BATCH_CANCELS):
+            chunk = order_ids[i:i + BINANCE_MAX_BATCH_CANCELS]
 
+            data = dict()
+            data['symbol'] = contract.symbol
+            data['orderIdList'] = codec.dumps(chunk)
 
-    def _on_error(self, ws, msg: str):
-        logger.error(f"Binance websocket connection error: {msg}")
+            response = self._make_request("DELETE", "/fapi/v1/batchOrders", data, PRIORITY_HIGH, signed=True)
+            statuses.extend(self._parse_batch_response(response, len(chunk), replace=True))
+
+        return statuses
+
+
+    def cancel_all_orders(self, contract: Contract) -> bool:
+        # Binance only acknowledges the request, it does not return the cancelled orders
+        data = dict()
+        data['symbol'] = contract.symbol
+
+        response = self._make_request("DELETE", "/fapi/v1/allOpenOrders", data, PRIORITY_HIGH, signed=True)
+
+        return response is not None
+
+
+    def _parse_batch_response(self, response, batch_size: int, replace: bool = False) -> typing.List[OrderStatus]:
+        if response is None:
+            return [None] * batch_size
+
+        statuses = []
+        for order_status in response:
+            if 'orderId' in order_status:
+                statuses.append(self._store_order(OrderStatus(order_status), replace))
+            else:
+                logger.error(f"Binance batch order rejected: {order_status}")
+                statuses.append(None)
+
+        return statuses
+
+
+    def get_ws_metrics(self) -> typing.List[typing.Dict]:
+        return self._ws_manager.metrics()
+
+
+    def is_quote_fresh(self, contract: Contract, max_age_ms: float) -> bool:
+        # to be checked before sending an order priced from self.prices
+        return self.latency.is_fresh(contract.symbol, max_age_ms)
+
+
+    def get_latency_metrics(self) -> typing.Dict:
+        metrics = self.latency.metrics()
+        metrics['ping_rtt_ms'] = self._ws_manager.ping_rtt()
+
+        return metrics
+
+
+    def get_ingest_metrics(self) -> typing.Dict:
+        return self._ingest.metrics()
 
 
     def _on_message(self, ws, msg: str):
-        data = json.loads(msg)
+        # runs on the websocket reader thread, it must stay as short as possible
+        receive_time = time.time()
+
+        if self._recorder is not None:
+            self._recorder.record("Binance", msg, receive_time)
+
+        self._ingest.put(msg, receive_time)
+
+
+    def _process_message(self, msg: str, receive_time: float):
+        data = codec.loads(msg)
 
         if "e" in data:
             if data['e'] == "bookTicker":
-                symbol = data['s']
+                self.price_board.update(data['s'], float(data['b']), float(data['a']), float(data['B']), float(data['A']), data['E'])
+                self.latency.record(data['s'], data['E'], receive_time)
+
+            elif data['e'] == "depthUpdate":
+                if data['s'] in self._book_syncs:
+                    self._book_syncs[data['s']].on_event(data)
+
+            elif data['e'] == "aggTrade":
+                for builder in self._candle_builders.get(data['s'], []):
+                    builder.on_trade(data['T'], float(data['p']), float(data['q']))
+
+            elif data['e'] == "kline":
+                k = data['k']
+                for builder in self._candle_builders.get(data['s'], []):
+                    if builder.interval == k['i']:
+                        builder.on_bar(k['t'], float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v']), k['x'])
+
+
+    def _on_user_event(self, data: typing.Dict):
+        if data['e'] == "ACCOUNT_UPDATE":
+            assets = set()
+
+            for p in data['a'].get('P', []):
+                self._position_pnl[(p['s'], p.get('ps', "BOTH"))] = (p['ma'], float(p['up']))
+                assets.add(p['ma'])
+
+            for b in data['a']['B']:
+                if b['a'] not in self.balances:
+                    self.balances[b['a']] = Balance({'initialMargin': 0, 'maintMargin': 0, 'marginBalance': b['wb'],
+                                                     'walletBalance': b['wb'], 'unrealizedProfit': 0})
+                self.balances[b['a']].wallet_balance = float(b['wb'])
+                assets.add(b['a'])
+
+            for asset in assets:
+                if asset in self.balances:
+                    balance = self.balances[asset]
+                    balance.unrealized_pnl = sum(pnl for a, pnl in self._position_pnl.values() if a == asset)
+                    balance.margin_balance = balance.wallet_balance + balance.unrealized_pnl
+
+        elif data['e'] == "ORDER_TRADE_UPDATE":
+            o = data['o']
+            self._store_order(OrderStatus({'orderId': o['i'], 'status': o['X'], 'avgPrice': o['ap']}), replace=True)
+
+
+    def _resync_streams(self, streams: typing.List[str]):
+        # called by a shard after it reconnected and subscribed again, updates missed meanwhile are fetched through REST
+        channels = dict()
+        for stream in streams:
+            symbol, channel = stream.split("@", 1)
+            channels.setdefault(channel, set()).add(symbol.upper())
+
+        book_tickers = channels.get("bookTicker", set())
+        if len(book_tickers) > 1:
+            self.get_all_bid_ask()
+        elif len(book_tickers) == 1:
+            symbol = book_tickers.pop()
+            if symbol in self.contracts:
+                self.get_bid_ask(self.contracts[symbol])
+
+        for symbol in channels.get("depth@100ms", set()):
+            if symbol in self._book_syncs:
+                self._book_syncs[symbol].resync()
+
+        logger.info(f"Binance resynchronized {len(streams)} streams after a websocket reconnection")
+
+
+    def _resync_account(self):
+        # account and order events sent while the user data stream was down are lost
+        balances = self.get_balances()
+        if len(balances) > 0:
+            self.balances = balances
 
-                if symbol not in self.prices:
-                    self.prices[symbol] = {'bid': float(data['b']), 'ask': float(data['a'])}
-                else:
-                    self.prices[symbol]['bid'] = float(data['b'])
-                    self.prices[symbol]['ask'] = float(data['a'])
+        data = dict()
 
+        open_orders = self._make_request("GET", "/fapi/v1/openOrders", data, signed=True)
+        if open_orders is not None:
+            open_ids = set()
+            for o in open_orders:
+                self._store_order(OrderStatus(o), replace=True)
+                open_ids.add(o['orderId'])
 
-    def subscribe_channel(self, contracts: typing.List[Contract], channel: str):
+            # the cached orders that were open and are not anymore were filled or cancelled during the outage: they are
+            # dropped so that get_order_status() asks the exchange for their final state
+            with self._orders_lock:
+                for order_id, order_status in list(self.orders.items()):
+                    if order_id not in open_ids and order_status.status not in BINANCE_FINAL_ORDER_STATUSES:
+                        del self.orders[order_id]
+
+
+    def get_order_book_snapshot(self, contract: Contract, limit: int = 1000):
         data = dict()
-        data['method'] = "SUBSCRIBE"
-        data['params'] = []
-        for contract in contracts:
-            data['params'].append(f"{contract.symbol.lower()}@{channel}")
-        data['id'] = self._ws_id
+        data['symbol'] = contract.symbol
+        data['limit'] = limit
 
-        try:
-            self._ws.send(json.dumps(data))
-        except Exception as e:
-            logger.error(f"Webscoket error while subscribing to {len(contracts)} {channel} updates: {e}")
-            return None
+        snapshot = self._make_request("GET", "/fapi/v1/depth", data)
+
+        if snapshot is not None and self._recorder is not None:
+            # the replay needs the snapshots to rebuild the books from the recorded diffs
+            self._recorder.record("Binance.depth", codec.dumps({'symbol': contract.symbol, 'snapshot': snapshot}))
+
+        return snapshot
+
+
+    def subscribe_order_book(self, contract: Contract, consumer: str = "books") -> OrderBook:
+        if contract.symbol not in self.order_books:
+            book = OrderBook(contract.symbol)
+            fetch_snapshot = None if self._replaying else lambda: self.get_order_book_snapshot(contract)
+            self._book_syncs[contract.symbol] = BinanceBookSync(book, fetch_snapshot)
+            self.order_books[contract.symbol] = book
 
-        self._ws_id += 1
+        self.subscribe([contract], "depth@100ms", consumer)
+
+        return self.order_books[contract.symbol]
+
+
+    def subscribe_candles(self, contract: Contract, interval: str, on_close=None, consumer: str = "candles",
+                          history=None) -> CandleBuilder:
+        # builder.candles starts with the REST history (or the given CandleSeries) and is then continued live from
+        # aggTrade and kline updates. During a replay the history is the one recorded in the tape with the subscription.
+        if history is None:
+            history = Candle.series_from_rows([]) if self._replaying else self.get_historical_candles(contract, interval)
+
+        if self._recorder is not None and not self._replaying:
+            self._recorder.record("Binance.candles", codec.dumps({'symbol': contract.symbol, 'interval': interval,
+                                                                  'timestamps': history.timestamps.tolist(),
+                                                                  'values': history.values.tolist()}))
+
+        builder = CandleBuilder(contract.symbol, interval, BINANCE_TF_MINUTES.get(interval, 0), history, on_close)
+
+        self._candle_builders.setdefault(contract.symbol, []).append(builder)
+        self._candle_clock.add(builder)
+
+        self.subscribe([contract], "aggTrade", consumer)
+        self.subscribe([contract], f"kline_{interval}", consumer)
+
+        return builder
+
+
+    def replay_targets(self) -> typing.Dict[str, typing.Callable]:
+        # used by TapeReplayer: from now on the books are only rebuilt from the snapshots found in the tape, the
+        # candle histories come from the tape too and the bars are closed by the replayed timestamps
+        self._replaying = True
+        self._candle_clock.paused = True
+        for symbol, book in self.order_books.items():
+            self._book_syncs[symbol] = BinanceBookSync(book)
+
+        return {"Binance": lambda msg: self._on_message(None, msg), "Binance.depth": self._replay_depth_snapshot,
+                "Binance.candles": self._replay_candle_history}
+
+
+    def _replay_depth_snapshot(self, msg: str):
+        data = codec.loads(msg)
+
+        # the diffs recorded before the snapshot must be buffered by the book first, as they were live
+        self._ingest.join()
+
+        if data['symbol'] in self._book_syncs:
+            self._book_syncs[data['symbol']].load_snapshot(data['snapshot'])
+
+
+    def _replay_candle_history(self, msg: str):
+        data = codec.loads(msg)
+
+        self._ingest.join()
+
+        for builder in self._candle_builders.get(data['symbol'], []):
+            if builder.interval == data['interval']:
+                builder.load_history(CandleSeries.from_rows(data['timestamps'], data['values'], Candle.from_values))
+
+
+    def wait_ingest(self):
+        self._ingest.join()
+
+
+    def subscribe(self, contracts: typing.List[Contract], channel: str, consumer: str):
+        streams = [f"{contract.symbol.lower()}@{channel}" for contract in contracts]
+
+        new_streams = self._subscriptions.acquire(streams, consumer)
+        if len(new_streams) > 0:
+            self._ws_manager.subscribe(new_streams)
+
+
+    def unsubscribe(self, contracts: typing.List[Contract], channel: str, consumer: str):
+        streams = [f"{contract.symbol.lower()}@{channel}" for contract in contracts]
+
+        released = self._subscriptions.release(streams, consumer)
+        if len(released) > 0:
+            self._ws_manager.unsubscribe(released)
+
+
+    def unsubscribe_all(self, consumer: str):
+        released = self._subscriptions.release_all(consumer)
+        if len(released) > 0:
+            self._ws_manager.unsubscribe(released)
+
+
+    def subscribe_channel(self, contracts: typing.List[Contract], channel: str):
+        self.subscribe(contracts, channel, "default")
@@ -0,0 +1,347 @@
+import logging
+import asyncio
+import time
+import typing
+
+from urllib.parse import urlencode
+
+import hmac
+import hashlib
+
+import aiohttp
+
+from connectors import codec
+from connectors.ws_supervisor import backoff_delay, WS_STALE_TIMEOUT, WS_STABLE_AFTER
+from connectors.binance_ws_manager import BINANCE_MAX_STREAMS_PER_CONNECTION, BINANCE_MAX_PARAMS_PER_MESSAGE, \
+    BINANCE_MESSAGE_INTERVAL
+from connectors.candle_series import CandleSeries
+from connectors.rate_limiter import BinanceRateLimiter, PRIORITY_HIGH, PRIORITY_NORMAL
+from connectors.models.binance_model import *
+
+logger = logging.getLogger()
+
+# asyncio version of BinanceFuturesClient: REST calls and the websocket all run on the caller's event loop,
+# so many clients and hundreds of in-flight requests can share a single thread
+# https://binance-docs.github.io/apidocs/futures/en/#market-data-endpoints
+class BinanceFuturesAsyncClient:
+    def __init__(self, api_key: str, api_secret: str, testnet: bool, max_connections: int = 100, base_url=None,
+                 wss_url=None):
+        if testnet:
+            self._base_url = "https://testnet.binancefuture.com"
+            self._wss_url = "wss://fstream.binancefuture.com/ws"
+        else:
+            self._base_url = "https://fapi.binance.com"
+            self._wss_url = "wss://fstream.binance.com/ws"
+
+        # a local mock exchange (benchmarks/mock_exchange.py) or a proxy can replace the exchange urls
+        if base_url is not None:
+            self._base_url = base_url
+        if wss_url is not None:
+            self._wss_url = wss_url
+
+        self._api_key = api_key
+        self._api_secret = api_secret
+
+        self._headers = {"X-MBX-APIKEY": self._api_key}
+
+        self._max_connections = max_connections
+        self._session = None
+
+        self._rate_limiter = BinanceRateLimiter()
+
+        self.contracts = dict()
+        self.balances = dict()
+
+        self.prices = dict()
+
+        # the streams are spread over as many websocket connections as the per-connection limit requires,
+        # connection index -> its streams / its websocket while it is open / its task
+        self._ws_id = 1
+        self._ws_streams = []
+        self._ws_connections = dict()
+        self._ws_tasks = []
+
+
+    async def start(self):
+        # must run inside the event loop, which is why it is not done in __init__
+        connector = aiohttp.TCPConnector(limit=self._max_connections, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(connector=connector, headers=self._headers)
+
+        self.contracts = await self.get_contracts()
+        self.balances = await self.get_balances()
+
+        await self.subscribe_channel(list(self.contracts.values()), "bookTicker")
+
+        logger.info("Binance Futures async Client successfully initialized")
+
+
+    async def close(self):
+        for task in self._ws_tasks:
+            task.cancel()
+        if self._session is not None:
+            await self._session.close()
+
+
+    def _generate_signature(self, data: typing.Dict) -> str:
+        return hmac.new(self._api_secret.encode(), urlencode(data).encode(), hashlib.sha256).hexdigest()
+
+
+    async def _make_request(self, method: str, endpoint: str, data: typing.Dict, priority: int = PRIORITY_NORMAL,
+                            signed: bool = False):
+        if method not in ("GET", "POST", "DELETE"):
+            raise ValueError()
+
+        await self._rate_limiter.acquire_async(method, endpoint, data, priority)
+
+        # signed after the wait for the rate limit, like BinanceFuturesClient._make_request
+        if signed:
+            data['timestamp'] = int(time.time() * 1000)
+            data['signature'] = self._generate_signature(data)
+
+        try:
+            async with self._session.request(method, f"{self._base_url}{endpoint}", params=data) as response:
+                response_data = codec.loads(await response.read())
+                status_code = response.status
+                self._rate_limiter.update_from_headers(status_code, response.headers)
+        except Exception as e:
+            logger.error(f"Connection error while making {method} request to {endpoint}: {e}")
+            return None
+
+        if status_code == 200:
+            return response_data
+        else:
+            logger.error(f"Error while making {method} request to {endpoint}: {response_data} (error code {status_code}")
+            return None
+
+
+    def get_rate_limit_usage(self) -> typing.Dict:
+        return self._rate_limiter.metrics()
+
+
+    async def get_contracts(self) -> typing.Dict[str, Contract]:
+        exchange_info = await self._make_request("GET", "/fapi/v1/exchangeInfo", dict())
+
+        contracts = dict()
+        if exchange_info is not None:
+            for contract_data in exchange_info['symbols']:
+                contracts[contract_data['pair']] = Contract(contract_data)
+
+        return contracts
+
+
+    async def get_balances(self) -> typing.Dict[str, Balance]:
+        data = dict()
+
+        balances = dict()
+
+        account_data = await self._make_request("GET", "/fapi/v1/account", data, signed=True)
+
+        if account_data is not None:
+            for a in account_data['assets']:
+                balances[a['asset']] = Balance(a)
+
+        return balances
+
+
+    async def get_historical_candles(self, contract: Contract, interval: str) -> CandleSeries:
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['interval'] = interval
+        data['limit'] = 1000
+
+        raw_candles = await self._make_request("GET", "/fapi/v1/klines", data)
+
+        if raw_candles is None:
+            return Candle.series_from_rows([])
+
+        return Candle.series_from_rows(raw_candles)
+
+
+    async def get_bid_ask(self, contract: Contract) -> typing.Dict[str, float]:
+        data = dict()
+        data['symbol'] = contract.symbol
+
+        ob_data = await self._make_request("GET", "/fapi/v1/ticker/bookTicker", data)
+
+        if ob_data is not None:
+            if contract.symbol not in self.prices:
+                self.prices[contract.symbol] = {'bid': float(ob_data['bidPrice']), 'ask': float(ob_data['askPrice'])}
+            else:
+                self.prices[contract.symbol]['bid'] = float(ob_data['bidPrice'])
+                self.prices[contract.symbol]['ask'] = float(ob_data['askPrice'])
+
+            return self.prices[contract.symbol]
+
+
+    async def get_order_status(self, contract: Contract, order_id: int) -> OrderStatus:
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['orderId'] = order_id
+
+        order_status = await self._make_request("GET", "/fapi/v1/order", data, signed=True)
+
+        if order_status is not None:
+            order_status = OrderStatus(order_status)
+
+        return order_status
+
+
+    async def place_order(self, contract: Contract, side: str, quantity: float, order_type: str, price=None, tif=None,
+                          normalize: bool = False) -> OrderStatus:
+        if normalize:
+            # same as BinanceFuturesClient.place_order
+            if contract.round_quantity(quantity) == 0:
+                logger.warning(f"{contract.symbol} order quantity {quantity} is smaller than the lot size {contract.lot_size}")
+                return None
+
+            quantity = contract.format_quantity(quantity)
+            if price is not None:
+                price = contract.format_price(price)
+
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['side'] = side
+        data['quantity'] = quantity
+        data['type'] = order_type
+        if price is not None:
+            data['price'] = price
+        if tif is not None:
+            data['timeInForce'] = tif
+
+        order_status = await self._make_request("POST", "/fapi/v1/order", data, PRIORITY_HIGH, signed=True)
+
+        if order_status is not None:
+            order_status = OrderStatus(order_status)
+
+        return order_status
+
+
+    async def cancel_order(self, contract: Contract, order_id: int) -> OrderStatus:
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['orderId'] = order_id
+
+        order_status = await self._make_request("DELETE", "/fapi/v1/order", data, PRIORITY_HIGH, signed=True)
+
+        if order_status is not None:
+            order_status = OrderStatus(order_status)
+
+        return order_status
+
+
+    def _add_connection(self) -> int:
+        index = len(self._ws_streams)
+        self._ws_streams.append([])
+        self._ws_tasks.append(asyncio.ensure_future(self._start_ws(index)))
+
+        return index
+
+
+    async def _start_ws(self, index: int):
+        attempt = 0
+
+        while True:
+            opened_at = None
+
+            try:
+                async with self._session.ws_connect(self._wss_url, heartbeat=30) as ws:
+                    self._ws_connections[index] = ws
+                    opened_at = time.time()
+                    await self._on_open(ws, index)
+
+                    while True:
+                        # a connection without any data for too long is dead even if the socket is still open
+                        msg = await ws.receive(timeout=WS_STALE_TIMEOUT)
+
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            self._on_message(ws, msg.data)
+                        elif msg.type == aiohttp.WSMsgType.ERROR:
+                            self._on_error(ws, str(ws.exception()))
+                            break
+                        elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED):
+                            break
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                logger.warning(f"Binance received no data for {WS_STALE_TIMEOUT} seconds, reconnecting")
+            except Exception as e:
+                logger.error(f"Binance error in websocket connection: {e}")
+
+            self._on_close(self._ws_connections.pop(index, None))
+
+            if opened_at is not None and time.time() - opened_at >= WS_STABLE_AFTER:
+                attempt = 0
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+
+    async def _on_open(self, ws, index: int):
+        logger.info(f"Binance websocket connection {index} opened")
+
+        # a new connection has no subscription, it subscribes again to its own streams
+        await self._send_subscribe(ws, list(self._ws_streams[index]))
+
+
+    def _on_close(self, ws):
+        logger.warning("Binance websocket connection closed")
+
+
+    def _on_error(self, ws, msg: str):
+        logger.error(f"Binance websocket connection error: {msg}")
+
+
+    def _on_message(self, ws, msg: str):
+        data = codec.loads(msg)
+
+        if "e" in data:
+            if data['e'] == "bookTicker":
+                symbol = data['s']
+
+                if symbol not in self.prices:
+                    self.prices[symbol] = {'bid': float(data['b']), 'ask': float(data['a'])}
+                else:
+                    self.prices[symbol]['bid'] = float(data['b'])
+                    self.prices[symbol]['ask'] = float(data['a'])
+
+
+    async def subscribe_channel(self, contracts: typing.List[Contract], channel: str):
+        subscribed = set().union(*self._ws_streams)
+        assignments = dict()
+
+        for contract in contracts:
+            stream = f"{contract.symbol.lower()}@{channel}"
+            if stream in subscribed:
+                continue
+            subscribed.add(stream)
+
+            # the connections are filled in order, a new one is only opened when all of them are full
+            index = next((i for i, streams in enumerate(self._ws_streams)
+                          if len(streams) < BINANCE_MAX_STREAMS_PER_CONNECTION), None)
+            if index is None:
+                index = self._add_connection()
+
+            self._ws_streams[index].append(stream)
+            assignments.setdefault(index, []).append(stream)
+
+        # a connection that is not open yet subscribes to its streams in _on_open
+        for index, streams in assignments.items():
+            ws = self._ws_connections.get(index)
+            if ws is not None:
+                await self._send_subscribe(ws, streams)
+
+
+    async def _send_subscribe(self, ws, streams: typing.List[str]):
+        for i in range(0, len(streams), BINANCE_MAX_PARAMS_PER_MESSAGE):
+            data = dict()
+            data['method'] = "SUBSCRIBE"
+            data['params'] = streams[i:i + BINANCE_MAX_PARAMS_PER_MESSAGE]
+            data['id'] = self._ws_id
+
+            try:
+                await ws.send_str(codec.dumps(data))
+            except Exception as e:
+                logger.error(f"Websocket error while subscribing to {len(data['params'])} streams: {e}")
+                return None
+
+            self._ws_id += 1
+            await asyncio.sleep(BINANCE_MESSAGE_INTERVAL)
@@ -0,0 +1,95 @@
+import logging
+import time
+import typing
+
+import threading
+
+from connectors import codec
+from connectors.ws_supervisor import WebsocketSupervisor
+
+logger = logging.getLogger()
+
+LISTEN_KEY_KEEPALIVE = 30 * 60  # seconds, a listenKey expires after 60 minutes without keepalive
+
+
+# https://binance-docs.github.io/apidocs/futures/en/#user-data-streams
+# Second websocket of the Binance client: account and order updates are pushed by the exchange
+# instead of being polled with signed REST requests
+class BinanceUserDataStream:
+    def __init__(self, client, wss_url: str, on_event: typing.Callable, on_reconnect=None):
+        self._client = client
+        self._wss_url = wss_url
+        self._on_event = on_event
+
+        self.listen_key = None
+
+        # an account can stay quiet for hours, only the pings detect a dead connection here
+        self._supervisor = WebsocketSupervisor("Binance user data stream", self._url, lambda ws: None, self._on_message,
+                                               on_reconnect=on_reconnect, stale_timeout=None)
+        self._running = False
+
+    @property
+    def connected(self) -> bool:
+        return self._supervisor.connected
+
+    def start(self):
+        self.listen_key = self._create_listen_key()
+        if self.listen_key is None:
+            logger.error("Binance user data stream not started, balances and orders will be polled")
+            return
+
+        self._running = True
+        self._supervisor.start()
+
+        t = threading.Thread(target=self._keepalive, daemon=True)
+        t.start()
+
+    def stop(self):
+        self._running = False
+        self._supervisor.stop()
+
+        if self.listen_key is not None:
+            self._client._make_request("DELETE", "/fapi/v1/listenKey", dict())
+            self.listen_key = None
+
+    def _create_listen_key(self):
+        # creating a listenKey while one is active returns the same key and extends it
+        response = self._client._make_request("POST", "/fapi/v1/listenKey", dict())
+
+        if response is not None:
+            return response['listenKey']
+
+        return None
+
+    def _keepalive(self):
+        while self._running:
+            time.sleep(LISTEN_KEY_KEEPALIVE)
+
+            if self._running and self._client._make_request("PUT", "/fapi/v1/listenKey", dict()) is None:
+                logger.warning("Binance listenKey keepalive failed, creating a new one")
+                self._renew()
+
+    def _renew(self):
+        listen_key = self._create_listen_key()
+
+        if listen_key is not None and listen_key != self.listen_key:
+            self.listen_key = listen_key
+            if self._supervisor.ws is not None:
+                self._supervisor.ws.close()  # the reconnection loop picks up the new key
+
+    def _url(self) -> str:
+        if self._supervisor.ws is not None:
+            # a dropped connection can mean an expired key, POST returns the active key or a new one
+            self.listen_key = self._create_listen_key() or self.listen_key
+
+        return f"{self._wss_url}/{self.listen_key}"
+
+    def _on_message(self, ws, msg: str):
+        data = codec.loads(msg)
+
+        if data.get('e') == "listenKeyExpired":
+            logger.warning("Binance listenKey expired, creating a new one")
+            self._renew()
+            return
+
+        self._on_event(data)
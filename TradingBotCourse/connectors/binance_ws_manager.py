@@ -0,0 +1,201 @@
+import logging
+import time
+import typing
+
+import threading
+
+from connectors import codec
+from connectors.latency import RollingHistogram
+from connectors.ws_supervisor import WebsocketSupervisor
+
+logger = logging.getLogger()
+
+# https://binance-docs.github.io/apidocs/futures/en/#websocket-market-streams
+BINANCE_MAX_STREAMS_PER_CONNECTION = 200
+BINANCE_MAX_PARAMS_PER_MESSAGE = 50
+BINANCE_MESSAGE_INTERVAL = 0.2  # seconds between control messages, a connection accepts 10 incoming messages per second
+
+
+def _event_time(msg: str):
+    # reads the "E" field without decoding the whole message, it is only needed for the lag metric
+    start = msg.find('"E":')
+    if start == -1:
+        return None
+
+    end = start + 4
+    while end < len(msg) and msg[end].isdigit():
+        end += 1
+
+    return int(msg[start + 4:end]) if end > start + 4 else None
+
+
+# One websocket connection carrying a subset of the market streams
+class BinanceStreamShard:
+    def __init__(self, shard_id: int, wss_url: str, on_message: typing.Callable, max_streams: int, on_reconnect=None):
+        self.shard_id = shard_id
+        self.max_streams = max_streams
+        self.streams = set()
+
+        self._on_message_callback = on_message
+        self._on_reconnect_callback = on_reconnect  # function(streams), called after a reconnection to resync the gap
+
+        self._supervisor = WebsocketSupervisor(f"Binance shard {shard_id}", wss_url, self._on_open, self._on_message,
+                                               on_reconnect=self._on_reconnect, expects_data=lambda: len(self.streams) > 0)
+        self._ws_id = 1
+        self._lock = threading.Lock()
+
+        self._message_count = 0
+        self._last_metrics_count = 0
+        self._last_metrics_time = time.time()
+        self._last_lag = None
+        self._max_lag = 0
+        self._lag = RollingHistogram(1000)
+
+    @property
+    def connected(self) -> bool:
+        return self._supervisor.connected
+
+    @property
+    def ping_rtt(self):
+        return self._supervisor.ping_rtt
+
+    def start(self):
+        self._supervisor.start()
+
+    def has_room(self, count: int = 1) -> bool:
+        return len(self.streams) + count <= self.max_streams
+
+    def subscribe(self, streams: typing.List[str]):
+        with self._lock:
+            self.streams.update(streams)
+
+        if self.connected:
+            self._send("SUBSCRIBE", streams)
+
+    def unsubscribe(self, streams: typing.List[str]):
+        with self._lock:
+            self.streams.difference_update(streams)
+
+        if self.connected:
+            self._send("UNSUBSCRIBE", streams)
+
+    def _send(self, method: str, streams: typing.List[str]):
+        streams = list(streams)
+
+        for i in range(0, len(streams), BINANCE_MAX_PARAMS_PER_MESSAGE):
+            data = dict()
+            data['method'] = method
+            data['params'] = streams[i:i + BINANCE_MAX_PARAMS_PER_MESSAGE]
+            data['id'] = self._ws_id
+
+            try:
+                self._supervisor.send(codec.dumps(data))
+            except Exception as e:
+                logger.error(f"Binance shard {self.shard_id} websocket error while sending {method} for {len(data['params'])} streams: {e}")
+                return
+
+            self._ws_id += 1
+            time.sleep(BINANCE_MESSAGE_INTERVAL)
+
+    def _on_open(self, ws):
+        # a new connection has no subscription, the shard subscribes again to its own streams only
+        with self._lock:
+            streams = list(self.streams)
+        self._send("SUBSCRIBE", streams)
+
+    def _on_reconnect(self):
+        if self._on_reconnect_callback is not None:
+            with self._lock:
+                streams = list(self.streams)
+            self._on_reconnect_callback(streams)
+
+    def _on_message(self, ws, msg: str):
+        self._message_count += 1
+
+        event_time = _event_time(msg)
+        if event_time is not None:
+            self._last_lag = time.time() * 1000 - event_time
+            self._max_lag = max(self._max_lag, self._last_lag)
+            self._lag.add(self._last_lag)
+
+        self._on_message_callback(ws, msg)
+
+    def metrics(self) -> typing.Dict:
+        now = time.time()
+        count = self._message_count
+        rate = (count - self._last_metrics_count) / max(now - self._last_metrics_time, 1e-9)
+
+        metrics = {'shard': self.shard_id, 'connected': self.connected, 'reconnects': self._supervisor.reconnects, 'streams': len(self.streams),
+                   'messages': count, 'message_rate': rate, 'lag_ms': self._last_lag, 'max_lag_ms': self._max_lag, 'lag_histogram_ms': self._lag.summary(),
+                   'ping_rtt_ms': self.ping_rtt.summary()}
+
+        self._last_metrics_count = count
+        self._last_metrics_time = now
+        self._max_lag = 0
+
+        return metrics
+
+
+# Spreads the market streams over several connections, each one below the per-connection limit,
+# so that one reader thread does not have to keep up with every symbol
+class BinanceStreamManager:
+    def __init__(self, wss_url: str, on_message: typing.Callable, shards: int = 2,
+                 max_streams_per_shard: int = BINANCE_MAX_STREAMS_PER_CONNECTION, on_reconnect=None):
+        self._wss_url = wss_url
+        self._on_message = on_message
+        self._on_reconnect = on_reconnect  # function(streams of the reconnected shard)
+        self._max_streams = max_streams_per_shard
+
+        self._shards = []
+        self._stream_shard = dict()  # stream name -> shard carrying it
+        self._lock = threading.Lock()
+
+        for _ in range(shards):
+            self._add_shard()
+
+    def _add_shard(self) -> BinanceStreamShard:
+        shard = BinanceStreamShard(len(self._shards), self._wss_url, self._on_message, self._max_streams,
+                                   on_reconnect=self._on_reconnect)
+        self._shards.append(shard)
+        shard.start()
+
+        return shard
+
+    def subscribe(self, streams: typing.List[str]):
+        assignments = dict()
+
+        with self._lock:
+            for stream in streams:
+                if stream in self._stream_shard:
+                    continue
+
+                # least loaded shard first, a new connection is only opened when all of them are full
+                candidates = [s for s in self._shards if s.has_room(len(assignments.get(s, [])) + 1)]
+                if len(candidates) > 0:
+                    shard = min(candidates, key=lambda s: len(s.streams) + len(assignments.get(s, [])))
+                else:
+                    shard = self._add_shard()
+
+                assignments.setdefault(shard, []).append(stream)
+                self._stream_shard[stream] = shard
+
+        for shard, shard_streams in assignments.items():
+            shard.subscribe(shard_streams)
+
+    def unsubscribe(self, streams: typing.List[str]):
+        removals = dict()
+
+        with self._lock:
+            for stream in streams:
+                shard = self._stream_shard.pop(stream, None)
+                if shard is not None:
+                    removals.setdefault(shard, []).append(stream)
+
+        for shard, shard_streams in removals.items():
+            shard.unsubscribe(shard_streams)
+
+    def metrics(self) -> typing.List[typing.Dict]:
+        return [shard.metrics() for shard in self._shards]
+
+    def ping_rtt(self) -> typing.Dict[int, typing.Dict]:
+        return {shard.shard_id: shard.ping_rtt.summary() for shard in self._shards}
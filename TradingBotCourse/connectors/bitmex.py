@@ -1,5 +1,4 @@
 import logging
-import requests
 import time
 import typing
 
@@ -8,18 +7,30 @@ from urllib.parse import urlencode
 import hmac
 import hashlib
 
-import websocket
-import json
-
-import threading
-
+from concurrent.futures import ThreadPoolExecutor
+
+from connectors import codec
+from connectors.http_session import PooledSession
+from connectors.bitmex_tables import BitmexTable, BitmexTableStore, MAX_TABLE_ROWS
+from connectors.subscriptions import SubscriptionRegistry
+from connectors.latency import LatencyMonitor
+from connectors.price_board import PriceBoard, PricesView
+from connectors.candle_builder import CandleBuilder, CandleClock
+from connectors.candle_series import CandleSeries
+from connectors.order_book import OrderBook, apply_bitmex_l2
+from connectors.ws_supervisor import WebsocketSupervisor
+from connectors.ingest import IngestPipeline, field_value, OVERFLOW_BLOCK
+from connectors.rate_limiter import BitmexRateLimiter, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
 from connectors.models.bitmex_model import *
 
 logger = logging.getLogger()
 
 # https://testnet.bitmex.com/api/explorer/
 class BitmexClient:
-    def __init__(self, api_key: str, api_secret: str, testnet: bool):
+    def __init__(self, api_key: str, api_secret: str, testnet: bool, pool_size: int = 10, max_idle: float = 60.0,
+                 history_workers: int = 3, subscribe_all_contracts: bool = True, ingest_workers: int = 1,
+                 ingest_queue_size: int = 10000, ingest_overflow: str = OVERFLOW_BLOCK, recorder=None,
+                 base_url=None, wss_url=None):
         if testnet:
             self._base_url = "https://testnet.bitmex.com"
             self._wss_url = "wss://ws.testnet.bitmex.com/realtime"
@@ -27,18 +38,79 @@ class BitmexClient:
             self._base_url = "https://www.bitmex.com"
             self._wss_url = "wss://ws.bitmex.com/realtime"
 
+        # a local mock exchange (benchmarks/mock_exchange.py) or a proxy can replace the exchange urls
+        if base_url is not None:
+            self._base_url = base_url
+        if wss_url is not None:
+            self._wss_url = wss_url
+
         self._api_key = api_key
         self._api_secret = api_secret
 
-        self.contracts = self.get_contracts()
-        self.balances = self.get_balances()
+        self._history_workers = history_workers  # parallel requests used to download long candle histories
 
-        self.prices = dict()
+        self._rate_limiter = BitmexRateLimiter()
 
-        self._ws = None
+        # shared by every REST call, warmed up with a few parallel requests
+        self._session = PooledSession(self._base_url, pool_size=pool_size, max_idle=max_idle)
+        self._session.warm_up(lambda: self._make_request("GET", "/api/v1", dict()), connections=min(pool_size, 4))
 
-        t = threading.Thread(target=self._start_ws)
-        t.start()
+        self.contracts = self.get_contracts()
+        self.balances = self.get_balances()
+
+        # top of book of every symbol in fixed array slots, prices keeps the former dict interface on top of it
+        self.price_board = PriceBoard(self.contracts.keys())
+        self.prices = PricesView(self.price_board)
+
+        # exchange, receive and dispatch times of the quote updates, see is_quote_fresh()
+        self.latency = LatencyMonitor("Bitmex")
+
+        # private websocket tables, kept current once the websocket is authenticated
+        self.orders = dict()  # orderID -> OrderStatus
+        self.executions = dict()  # execID -> execution row
+        self.positions = dict()  # symbol -> position row
+
+        # every websocket table is kept here, callers can register their own callbacks with tables.on_change()
+        self.tables = BitmexTableStore()
+        self.tables.on_change("instrument", self._on_instrument, ['symbol'])
+        # executions and finished orders only accumulate, the oldest ones are dropped (open orders are always kept)
+        self.tables.table("execution", BITMEX_PRIVATE_TABLE_KEYS['execution'], MAX_TABLE_ROWS)
+        self.tables.table("order", BITMEX_PRIVATE_TABLE_KEYS['order'], MAX_TABLE_ROWS,
+                          lambda row: row.get('ordStatus') in BITMEX_CLOSED_ORDER_STATUSES)
+        for table, keys in BITMEX_PRIVATE_TABLE_KEYS.items():
+            self.tables.on_change(table, self._on_private_table, keys)
+
+        self._authenticated = False
+
+        # topics are only subscribed while a consumer needs them, the client itself holds the private tables
+        self._subscriptions = SubscriptionRegistry()
+        self._subscriptions.acquire(list(BITMEX_PRIVATE_TABLE_KEYS), "client")
+        if subscribe_all_contracts:
+            self._subscriptions.acquire(["instrument"], "all_contracts")
+
+        # full depth books maintained from orderBookL2, symbol -> OrderBook
+        self.order_books = dict()
+        self.tables.on_change("orderBookL2", self._on_order_book_l2, ['symbol', 'id', 'side'])
+
+        # live candles built from the trade streams, symbol -> list of CandleBuilder
+        self._candle_builders = dict()
+        self._candle_clock = CandleClock()
+        self.tables.on_change("trade", self._on_trade)
+        for timeframe in BITMEX_TF_MINUTES:
+            self.tables.on_change(f"tradeBin{timeframe}", self._on_trade_bin)
+
+        # optional TapeRecorder receiving every raw market data frame
+        self._recorder = recorder
+        self._replaying = False
+
+        # websocket frames are decoded by worker threads, frames of one table always go to the same worker
+        self._ingest = IngestPipeline("Bitmex", self._process_message, lambda msg: field_value(msg, "table"),
+                                      ingest_workers, ingest_queue_size, ingest_overflow)
+
+        # reconnects with backoff, subscribes again in _on_open and resynchronizes prices through REST
+        self._ws = WebsocketSupervisor("Bitmex", self._wss_url, self._on_open, self._on_message,
+                                       on_reconnect=self._resync_prices, expects_data=self._has_market_topics)
+        self._ws.start()
            
         logger.info("Bitmex Client successfully initialized")
 
@@ -49,41 +121,38 @@ class BitmexClient:
         return hmac.new(self._api_secret.encode(), message.encode(), hashlib.sha256).hexdigest()
 
 
-    def _make_request(self, method: str, endpoint: str, data: typing.Dict):
+    def _make_request(self, method: str, endpoint: str, data: typing.Dict, priority: int = PRIORITY_NORMAL):
+        if method not in ("GET", "POST", "DELETE"):
+            raise ValueError()
+
+        self._rate_limiter.acquire(method, endpoint, data, priority)
+
+        # the signature is only valid 5 seconds, it is computed after the wait for the rate limit
         headers = dict()
         expires = str(int(time.time()) + 5) # valid for 5 seconds
         headers['api-expires'] = expires
         headers['api-key'] = self._api_key
         headers['api-signature'] = self._generate_signature(method, endpoint, expires, data)
 
-        if method == "GET":
-            try:
-                response = requests.get(f"{self._base_url}{endpoint}", params=data, headers=headers)
-            except Exception as e:
-                logger.error(f"Connection error while making {method} request to {endpoint}: {e}")
-                return None
-        elif method == "POST":
-            try:
-                response = requests.post(f"{self._base_url}{endpoint}", params=data, headers=headers)
-            except Exception as e:
-                logger.error(f"Connection error while making {method} request to {endpoint}: {e}")
-                return None
-        elif method == "DELETE":
-            try:
-                response = requests.delete(f"{self._base_url}{endpoint}", params=data, headers=headers)
-            except Exception as e:
-                logger.error(f"Connection error while making {method} request to {endpoint}: {e}")
-                return None
-        else:
-            raise ValueError()
+        try:
+            response = self._session.request(method, endpoint, params=data, headers=headers)
+        except Exception as e:
+            logger.error(f"Connection error while making {method} request to {endpoint}: {e}")
+            return None
+
+        self._rate_limiter.update_from_headers(response.status_code, response.headers)
 
         if response.status_code == 200:
-            return response.json()
+            return codec.loads(response.content)
         else:
-            logger.error(f"Error while making {method} request to {endpoint}: {response.json()} (error code {response.status_code}")
+            logger.error(f"Error while making {method} request to {endpoint}: {codec.loads(response.content)} (error code {response.status_code}")
             return None
 
     
+    def get_rate_limit_usage(self) -> typing.Dict:
+        return self._rate_limiter.metrics()
+
+
     def get_contracts(self) -> typing.Dict[str, Contract]:
 
         instruments = self._make_request("GET", "/api/v1/instrument/active", dict())
@@ -112,25 +181,77 @@ class BitmexClient:
         return balances
 
 
-    def get_historical_candles(self, contract: Contract, timeframe: str) -> typing.List[Candle]:
+    def get_historical_candles(self, contract: Contract, timeframe: str, start_time=None, end_time=None) -> CandleSeries:
+        if start_time is not None:
+            return self._get_historical_candles_range(contract, timeframe, start_time, end_time)
+
         data = dict()
         data['symbol'] = contract.symbol
         data['partial'] = True
         data['binSize'] = timeframe
         data['count'] = 500
+        data['reverse'] = True  # the newest 500 buckets, put back in chronological order below
+
+        raw_candles = self._make_request("GET", "/api/v1/trade/bucketed", data)
+
+        if raw_candles is None:
+            return Candle.series_from_rows([], timeframe)
+
+        return Candle.series_from_rows(reversed(raw_candles), timeframe)
+
 
-        raw_candles = self._make_request("GET", "/pai/v1/trade/bucketed", data)
+    def _get_historical_candles_range(self, contract: Contract, timeframe: str, start_time: int, end_time=None) -> CandleSeries:
+        # start_time and end_time are Unix timestamps in milliseconds, the range is split into windows of
+        # 1000 candles (the bucketed trades maximum) that are downloaded in parallel and merged back in order
+        if end_time is None:
+            end_time = int(time.time() * 1000)
 
-        candles = []
+        tf_ms = BITMEX_TF_MINUTES[timeframe] * 60 * 1000
+        window_ms = 1000 * tf_ms
 
-        if raw_candles is not None:
-            for c in reversed(raw_candles):
-                candles.append(Candle(c, timeframe))
+        windows = []
+        window_start = start_time
+        while window_start <= end_time:
+            windows.append((window_start, min(window_start + window_ms - tf_ms, end_time)))
+            window_start += window_ms
+
+        with ThreadPoolExecutor(max_workers=self._history_workers) as executor:
+            pages = executor.map(lambda w: self._get_candles_window(contract, timeframe, w[0], w[1]), windows)
+
+            raw_candles = dict()
+            for page in pages:
+                for c in page:
+                    raw_candles[c['timestamp']] = c  # windows can overlap on the edges, keep one candle per timestamp
+
+        return Candle.series_from_rows([raw_candles[ts] for ts in sorted(raw_candles)], timeframe)
+
+
+    def _get_candles_window(self, contract: Contract, timeframe: str, start_time: int, end_time: int) -> typing.List:
+        # Bitmex timestamps a bucket with its close time, so the window is shifted by one timeframe
+        tf_ms = BITMEX_TF_MINUTES[timeframe] * 60 * 1000
+
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['binSize'] = timeframe
+        data['startTime'] = ms_to_iso(start_time + tf_ms)
+        data['endTime'] = ms_to_iso(end_time + tf_ms)
+        data['count'] = 1000
 
-        return candles
+        raw_candles = self._make_request("GET", "/api/v1/trade/bucketed", data, PRIORITY_LOW)
+
+        if raw_candles is None:
+            logger.warning(f"Missing {contract.symbol} {timeframe} candles between {start_time} and {end_time}")
+            return []
+
+        return raw_candles
 
 
     def get_order_status(self, order_id: str, contract: Contract):
+        # O(1) lookup in the websocket order table while it is live, REST when the websocket is down, not authenticated
+        # or still waiting for the order partial after a reconnection
+        if self._ws.connected and self._authenticated and self.tables.table("order").ready and order_id in self.orders:
+            return self.orders[order_id]
+
         data = dict()
         data['symbol'] = contract.symbol
         data['reverse'] = True # return the newest order id first
@@ -140,10 +261,21 @@ class BitmexClient:
         if order_status is not None:
             for order in order_status:
                 if order['orderID'] == order_id:
-                    return OrderStatus(order_status[0])
+                    return OrderStatus(order)
 
 
-    def place_order(self, contract: Contract, order_type: str, quantity: int, side: str, price=None, tif=None) -> OrderStatus:
+    def place_order(self, contract: Contract, order_type: str, quantity: int, side: str, price=None, tif=None,
+                    normalize: bool = False) -> OrderStatus:
+        if normalize:
+            # orderQty must be a multiple of lotSize and price of tickSize (0.5 on XBTUSD), or the order is rejected
+            if contract.round_quantity(quantity) == 0:
+                logger.warning(f"{contract.symbol} order quantity {quantity} is smaller than the lot size {contract.lot_size}")
+                return None
+
+            quantity = contract.format_quantity(quantity)
+            if price is not None:
+                price = contract.format_price(price)
+
         data = dict()
         data['symbol'] = contract.symbol
         data['type'] = order_type.capitalize()
@@ -156,7 +288,7 @@ class BitmexClient:
         if tif is not None:
             data['timeInForce'] = tif
 
-        order_status = self._make_request("POST", "/api/v1/order", data)
+        order_status = self._make_request("POST", "/api/v1/order", data, PRIORITY_HIGH)
 
         if order_status is not None:
             order_status = OrderStatus(order_status)
@@ -168,7 +300,7 @@ class BitmexClient:
         data = dict()
         data['orderID'] = order_id
 
-        order_status = self._make_request("DELETE", "/api/v1/order", data)
+        order_status = self._make_request("DELETE", "/api/v1/order", data, PRIORITY_HIGH)
 
         if order_status is not None:
             order_status = OrderStatus(order_status[0])
@@ -176,53 +308,325 @@ class BitmexClient:
         return order_status
 
 
-    def _start_ws(self):
-        self._ws = websocket.WebSocketApp(self._wss_url, on_open=self._on_open, on_close=self._on_close, on_error=self._on_error, on_message=self._on_message)
+    def place_batch_orders(self, orders: typing.List[typing.Dict]) -> typing.List[OrderStatus]:
+        # each order is a dict with the place_order arguments: contract, order_type, quantity, side, price, tif
+        # returns one OrderStatus per order in submission order
+        batch = []
+        for order in orders:
+            order_data = dict()
+            order_data['symbol'] = order['contract'].symbol
+            order_data['ordType'] = order['order_type'].capitalize()
+            order_data['orderQty'] = order['quantity']
+            order_data['side'] = order['side'].capitalize()
+            if order.get('price') is not None:
+                order_data['price'] = order['price']
+            if order.get('tif') is not None:
+                order_data['timeInForce'] = order['tif']
+            batch.append(order_data)
+
+        data = dict()
+        data['orders'] = codec.dumps(batch)
+
+        response = self._make_request("POST", "/api/v1/order/bulk", data, PRIORITY_HIGH)
+
+        if response is None:
+            return [None] * len(orders)
+
+        return [OrderStatus(order_status) for order_status in response]
+
+
+    def cancel_batch_orders(self, order_ids: typing.List[str]) -> typing.List[OrderStatus]:
+        data = dict()
+        data['orderID'] = codec.dumps(order_ids)
 
-        while True:
-            try:
-                self._ws.run_forever()
-            except Exception as e:
-                logger.error(f"Bitmex error in run_forever() method: {e}")
-            time.sleep(2) # just to give time to connection to restart instead of keep asking at every clock
+        response = self._make_request("DELETE", "/api/v1/order", data, PRIORITY_HIGH)
+
+        if response is None:
+            return [None] * len(order_ids)
+
+        # the response is not guaranteed to follow the request order
+        cancelled = {order_status['orderID']: order_status for order_status in response}
+
+        return [OrderStatus(cancelled[order_id]) if order_id in cancelled else None for order_id in order_ids]
+
+
+    def cancel_all_orders(self, contract: Contract) -> typing.List[OrderStatus]:
+        data = dict()
+        data['symbol'] = contract.symbol
+
+        response = self._make_request("DELETE", "/api/v1/order/all", data, PRIORITY_HIGH)
+
+        if response is None:
+            return []
+
+        return [OrderStatus(order_status) for order_status in response]
+
+
+    def _has_market_topics(self) -> bool:
+        # the private tables stay quiet while there is no trading activity
+        return any(topic.split(":")[0] not in BITMEX_PRIVATE_TABLE_KEYS for topic in self._subscriptions.active())
 
 
     def _on_open(self, ws):
         logger.info("Bitmex websocket connection opened")
 
-        self.subscribe_channel("instrument")
+        self._authenticated = False
+        self._authenticate_ws()
 
+        # changes sent while disconnected are lost, the books stay unsynced until their new partial
+        self.tables.reset()
+        for book in self.order_books.values():
+            book.clear()
 
-    def _on_close(self, ws):
-        logger.warning("Bitmex websocket connection closed")
+        # a new connection has no subscription, every topic still held by a consumer is subscribed again
+        self._send_op("subscribe", self._subscriptions.active())
 
 
-    def _on_error(self, ws, msg: str):
-        logger.error(f"Bitmex websocket connection error: {msg}")
+    # https://www.bitmex.com/app/wsAPI#API-Keys
+    def _authenticate_ws(self):
+        expires = int(time.time()) + 5
+
+        data = dict()
+        data['op'] = "authKeyExpires"
+        data['args'] = [self._api_key, expires, self._generate_signature("GET", "/realtime", str(expires), dict())]
+
+        try:
+            self._ws.send(codec.dumps(data))
+        except Exception as e:
+            logger.error(f"Websocket error while authenticating: {e}")
+
+
+    def _resync_prices(self):
+        # the instrument partial only comes with the instrument subscription, quotes are fetched through REST
+        instruments = self._make_request("GET", "/api/v1/instrument/active", dict())
+
+        if instruments is not None:
+            now = int(time.time() * 1000)
+            for s in instruments:
+                if s['symbol'] in self.price_board:
+                    self.price_board.update(s['symbol'], s.get('bidPrice'), s.get('askPrice'), timestamp=now)
+            self._record_quotes(instruments, now / 1000)
+
+
+    def is_quote_fresh(self, contract: Contract, max_age_ms: float) -> bool:
+        # to be checked before sending an order priced from self.prices
+        return self.latency.is_fresh(contract.symbol, max_age_ms)
+
+
+    def get_latency_metrics(self) -> typing.Dict:
+        metrics = self.latency.metrics()
+        metrics['ping_rtt_ms'] = self._ws.ping_rtt.summary()
+
+        return metrics
+
+
+    def get_ingest_metrics(self) -> typing.Dict:
+        return self._ingest.metrics()
 
 
     def _on_message(self, ws, msg: str):
-        data = json.loads(msg)
+        # runs on the websocket reader thread, it must stay as short as possible
+        receive_time = time.time()
+
+        if self._recorder is not None:
+            self._recorder.record("Bitmex", msg, receive_time)
+
+        self._ingest.put(msg, receive_time)
+
+
+    def _process_message(self, msg: str, receive_time: float):
+        data = codec.loads(msg)
+
+        if data.get('request', dict()).get('op') == "authKeyExpires":
+            self._authenticated = data.get('success', False)
+            if not self._authenticated:
+                logger.error(f"Bitmex websocket authentication failed: {data.get('error')}")
 
         if "table" in data:
-            if data['table'] == "instrument":
-                for d in data['data']:
-                    symbol = d['symbol']
-                    if symbol not in self.prices:
-                        self.prices[symbol] = { 'bid': None, 'ask': None }
-                    if 'bidPrice' in d:
-                        self.prices[symbol]['bid'] = d['bidPrice']
-                    if 'askPrice' in d:
-                        self.prices[symbol]['ask'] = d['askPrice']
+            self.tables.apply_message(data)
+
+            if data['table'] == "instrument" and data.get('action') != "delete":
+                self._record_quotes(data['data'], receive_time)
+
+
+    def _record_quotes(self, rows: typing.List[typing.Dict], receive_time: float):
+        dispatch_time = time.time()
+
+        for d in rows:
+            if 'bidPrice' in d or 'askPrice' in d:
+                exchange_time = iso_to_ms(d['timestamp']) if 'timestamp' in d else None
+                self.latency.record(d['symbol'], exchange_time, receive_time, dispatch_time)
+
+
+    def _on_instrument(self, table: BitmexTable, action: str, rows: typing.List[typing.Dict]):
+        if action == "delete":
+            return
+
+        now = int(time.time() * 1000)
+
+        for d in rows:
+            # the exchange timestamp of the row, the same when the frame is replayed
+            timestamp = iso_to_ms(d['timestamp']) if 'timestamp' in d else now
+            self.price_board.update(d['symbol'], d.get('bidPrice'), d.get('askPrice'), timestamp=timestamp)
+
+
+    def _on_order_book_l2(self, table: BitmexTable, action: str, rows: typing.List[typing.Dict]):
+        apply_bitmex_l2(self.order_books, action, rows)
+
+
+    def _on_trade(self, table: BitmexTable, action: str, rows: typing.List[typing.Dict]):
+        if action == "partial":
+            return  # the partial holds trades that are already in the REST history
+
+        for d in rows:
+            builders = self._candle_builders.get(d['symbol'])
+            if builders:
+                timestamp = iso_to_ms(d['timestamp'])
+                for builder in builders:
+                    builder.on_trade(timestamp, d['price'], d['size'])
+
+
+    def _on_trade_bin(self, table: BitmexTable, action: str, rows: typing.List[typing.Dict]):
+        if action == "partial":
+            return
+
+        timeframe = table.name[len("tradeBin"):]
+
+        for d in rows:
+            for builder in self._candle_builders.get(d['symbol'], []):
+                if builder.interval == timeframe:
+                    # Bitmex bins are timestamped with their close time and only published once closed
+                    open_time = iso_to_ms(d['timestamp']) - BITMEX_TF_MINUTES[timeframe] * 60 * 1000
+                    builder.on_bar(open_time, d['open'], d['high'], d['low'], d['close'], d['volume'], True)
+
+
+    def _on_private_table(self, table: BitmexTable, action: str, rows: typing.List[typing.Dict]):
+        if table.name == "order":
+            self._on_order_table(table, action, rows)
+            return
+
+        if action == "delete":
+            return
+
+        for row in rows:
+            if table.name == "execution":
+                self.executions[row['execID']] = row
+                if len(self.executions) > MAX_TABLE_ROWS:
+                    del self.executions[next(iter(self.executions))]
+            elif table.name == "margin":
+                self.balances[row['currency']] = Balance(row)
+            elif table.name == "position":
+                self.positions[row['symbol']] = row
+
+
+    def _on_order_table(self, table: BitmexTable, action: str, rows: typing.List[typing.Dict]):
+        if action == "partial":
+            # the orders closed while the websocket was down are not in the new partial, the cache is rebuilt from it
+            self.orders = {row['orderID']: OrderStatus(row) for row in table.rows.values()}
+        elif action == "delete":
+            for row in rows:
+                self.orders.pop(row['orderID'], None)
+        else:
+            for row in rows:
+                self.orders[row['orderID']] = OrderStatus(row)
+
+            # the table drops its oldest finished orders above MAX_TABLE_ROWS, the cache forgets them too
+            if len(self.orders) > len(table.rows):
+                for order_id in [i for i in self.orders if table.get(i) is None]:
+                    del self.orders[order_id]
+
+
+    def subscribe_order_book(self, contract: Contract, consumer: str = "books") -> OrderBook:
+        if contract.symbol not in self.order_books:
+            self.order_books[contract.symbol] = OrderBook(contract.symbol)
+
+        self.subscribe([contract], "orderBookL2", consumer)
+
+        return self.order_books[contract.symbol]
+
+
+    def subscribe_candles(self, contract: Contract, timeframe: str, on_close=None, consumer: str = "candles",
+                          history=None) -> CandleBuilder:
+        # builder.candles starts with the REST history (or the given CandleSeries) and is then continued live from
+        # trade and tradeBin updates. During a replay the history is the one recorded in the tape.
+        if history is None:
+            history = Candle.series_from_rows([], timeframe) if self._replaying else self.get_historical_candles(contract, timeframe)
+
+        if self._recorder is not None and not self._replaying:
+            self._recorder.record("Bitmex.candles", codec.dumps({'symbol': contract.symbol, 'timeframe': timeframe,
+                                                                 'timestamps': history.timestamps.tolist(),
+                                                                 'values': history.values.tolist()}))
+
+        builder = CandleBuilder(contract.symbol, timeframe, BITMEX_TF_MINUTES[timeframe], history, on_close)
+
+        self._candle_builders.setdefault(contract.symbol, []).append(builder)
+        self._candle_clock.add(builder)
+
+        self.subscribe([contract], "trade", consumer)
+        self.subscribe([contract], f"tradeBin{timeframe}", consumer)
+
+        return builder
+
+
+    def replay_targets(self) -> typing.Dict[str, typing.Callable]:
+        # used by TapeReplayer, the tables and books are rebuilt from the recorded partials, the candle histories
+        # from the recorded ones and the bars are closed by the replayed timestamps instead of the wall clock
+        self._replaying = True
+        self._candle_clock.paused = True
+
+        return {"Bitmex": lambda msg: self._on_message(None, msg), "Bitmex.candles": self._replay_candle_history}
+
+
+    def _replay_candle_history(self, msg: str):
+        data = codec.loads(msg)
+
+        self._ingest.join()
+
+        for builder in self._candle_builders.get(data['symbol'], []):
+            if builder.interval == data['timeframe']:
+                builder.load_history(CandleSeries.from_rows(data['timestamps'], data['values'], Candle.from_values))
+
+
+    def wait_ingest(self):
+        self._ingest.join()
+
+
+    def subscribe(self, contracts, table: str, consumer: str):
+        # contracts=None subscribes to the whole table instead of one topic per symbol
+        topics = [table] if contracts is None else [f"{table}:{contract.symbol}" for contract in contracts]
+
+        new_topics = self._subscriptions.acquire(topics, consumer)
+        if len(new_topics) > 0:
+            self._send_op("subscribe", new_topics)
+
+
+    def unsubscribe(self, contracts, table: str, consumer: str):
+        topics = [table] if contracts is None else [f"{table}:{contract.symbol}" for contract in contracts]
+
+        released = self._subscriptions.release(topics, consumer)
+        if len(released) > 0:
+            self._send_op("unsubscribe", released)
+
+
+    def unsubscribe_all(self, consumer: str):
+        released = self._subscriptions.release_all(consumer)
+        if len(released) > 0:
+            self._send_op("unsubscribe", released)
 
 
     def subscribe_channel(self, topic: str):
+        self.subscribe(None, topic, "default")
+
+
+    def _send_op(self, op: str, topics: typing.List[str]):
+        if not self._ws.connected or len(topics) == 0:
+            return  # sent from _on_open once connected
+
         data = dict()
-        data['op'] = "subscribe"
-        data['args'] = []
-        data['params'].append(topic)
+        data['op'] = op
+        data['args'] = topics
 
         try:
-            self._ws.send(json.dumps(data))
+            self._ws.send(codec.dumps(data))
         except Exception as e:
-            logger.error(f"Websocket error while subscribing to {topic} updates: {e}", topic, e)
\ No newline at end of file
+            logger.error(f"Websocket error while sending {op} for {topics}: {e}")
@@ -0,0 +1,297 @@
+import logging
+import asyncio
+import time
+import typing
+
+from urllib.parse import urlencode
+
+import hmac
+import hashlib
+
+import aiohttp
+
+from connectors import codec
+from connectors.ws_supervisor import backoff_delay, WS_STALE_TIMEOUT, WS_STABLE_AFTER
+from connectors.candle_series import CandleSeries
+from connectors.rate_limiter import BitmexRateLimiter, PRIORITY_HIGH, PRIORITY_NORMAL
+from connectors.models.bitmex_model import *
+
+logger = logging.getLogger()
+
+# asyncio version of BitmexClient: REST calls and the websocket all run on the caller's event loop,
+# so many clients and hundreds of in-flight requests can share a single thread
+# https://testnet.bitmex.com/api/explorer/
+class BitmexAsyncClient:
+    def __init__(self, api_key: str, api_secret: str, testnet: bool, max_connections: int = 100, base_url=None,
+                 wss_url=None):
+        if testnet:
+            self._base_url = "https://testnet.bitmex.com"
+            self._wss_url = "wss://ws.testnet.bitmex.com/realtime"
+        else:
+            self._base_url = "https://www.bitmex.com"
+            self._wss_url = "wss://ws.bitmex.com/realtime"
+
+        # a local mock exchange (benchmarks/mock_exchange.py) or a proxy can replace the exchange urls
+        if base_url is not None:
+            self._base_url = base_url
+        if wss_url is not None:
+            self._wss_url = wss_url
+
+        self._api_key = api_key
+        self._api_secret = api_secret
+
+        self._max_connections = max_connections
+        self._session = None
+
+        self._rate_limiter = BitmexRateLimiter()
+
+        self.contracts = dict()
+        self.balances = dict()
+
+        self.prices = dict()
+
+        self._ws = None
+        self._ws_task = None
+
+
+    async def start(self):
+        # must run inside the event loop, which is why it is not done in __init__
+        connector = aiohttp.TCPConnector(limit=self._max_connections, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(connector=connector)
+
+        self.contracts = await self.get_contracts()
+        self.balances = await self.get_balances()
+
+        self._ws_task = asyncio.ensure_future(self._start_ws())
+
+        logger.info("Bitmex async Client successfully initialized")
+
+
+    async def close(self):
+        if self._ws_task is not None:
+            self._ws_task.cancel()
+        if self._session is not None:
+            await self._session.close()
+
+
+    # https://bitmex.com/app/apiKeysUsage
+    def _generate_signature(self, method: str, endpoint: str, expires: str, data: typing.Dict) -> str:
+        message = f"{method}{endpoint}?{urlencode(data)}{expires}" if len(data) > 0 else f"{method}{endpoint}{expires}"
+
+        return hmac.new(self._api_secret.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+    async def _make_request(self, method: str, endpoint: str, data: typing.Dict, priority: int = PRIORITY_NORMAL):
+        if method not in ("GET", "POST", "DELETE"):
+            raise ValueError()
+
+        await self._rate_limiter.acquire_async(method, endpoint, data, priority)
+
+        # the signature is only valid 5 seconds, it is computed after the wait for the rate limit
+        headers = dict()
+        expires = str(int(time.time()) + 5) # valid for 5 seconds
+        headers['api-expires'] = expires
+        headers['api-key'] = self._api_key
+        headers['api-signature'] = self._generate_signature(method, endpoint, expires, data)
+
+        # the query string is built here so that it is byte for byte the one that was signed
+        url = f"{self._base_url}{endpoint}?{urlencode(data)}" if len(data) > 0 else f"{self._base_url}{endpoint}"
+
+        try:
+            async with self._session.request(method, url, headers=headers) as response:
+                response_data = codec.loads(await response.read())
+                status_code = response.status
+                self._rate_limiter.update_from_headers(status_code, response.headers)
+        except Exception as e:
+            logger.error(f"Connection error while making {method} request to {endpoint}: {e}")
+            return None
+
+        if status_code == 200:
+            return response_data
+        else:
+            logger.error(f"Error while making {method} request to {endpoint}: {response_data} (error code {status_code}")
+            return None
+
+
+    def get_rate_limit_usage(self) -> typing.Dict:
+        return self._rate_limiter.metrics()
+
+
+    async def get_contracts(self) -> typing.Dict[str, Contract]:
+        instruments = await self._make_request("GET", "/api/v1/instrument/active", dict())
+
+        contracts = dict()
+
+        if instruments is not None:
+            for s in instruments:
+                contracts[s['symbol']] = Contract(s)
+
+        return contracts
+
+
+    async def get_balances(self) -> typing.Dict[str, Balance]:
+        data = dict()
+        data['currency'] = "all"
+
+        margin_data = await self._make_request("GET", "/api/v1/user/margin", data)
+
+        balances = dict()
+
+        if margin_data is not None:
+            for a in margin_data:
+                balances[a['currency']] = Balance(a)
+
+        return balances
+
+
+    async def get_historical_candles(self, contract: Contract, timeframe: str) -> CandleSeries:
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['partial'] = True
+        data['binSize'] = timeframe
+        data['count'] = 500
+        data['reverse'] = True  # the newest 500 buckets, put back in chronological order below
+
+        raw_candles = await self._make_request("GET", "/api/v1/trade/bucketed", data)
+
+        if raw_candles is None:
+            return Candle.series_from_rows([], timeframe)
+
+        return Candle.series_from_rows(reversed(raw_candles), timeframe)
+
+
+    async def get_order_status(self, order_id: str, contract: Contract):
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['reverse'] = True # return the newest order id first
+
+        order_status = await self._make_request("GET", "/api/v1/order", data)
+
+        if order_status is not None:
+            for order in order_status:
+                if order['orderID'] == order_id:
+                    return OrderStatus(order)
+
+
+    async def place_order(self, contract: Contract, order_type: str, quantity: int, side: str, price=None, tif=None,
+                          normalize: bool = False) -> OrderStatus:
+        if normalize:
+            # same as BitmexClient.place_order
+            if contract.round_quantity(quantity) == 0:
+                logger.warning(f"{contract.symbol} order quantity {quantity} is smaller than the lot size {contract.lot_size}")
+                return None
+
+            quantity = contract.format_quantity(quantity)
+            if price is not None:
+                price = contract.format_price(price)
+
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['type'] = order_type.capitalize()
+        data['orderQty'] = quantity
+        data['side'] = side.capitalize()
+
+        if price is not None:
+            data['price'] = price
+
+        if tif is not None:
+            data['timeInForce'] = tif
+
+        order_status = await self._make_request("POST", "/api/v1/order", data, PRIORITY_HIGH)
+
+        if order_status is not None:
+            order_status = OrderStatus(order_status)
+
+        return order_status
+
+
+    async def cancel_order(self, order_id: str) -> OrderStatus:
+        data = dict()
+        data['orderID'] = order_id
+
+        order_status = await self._make_request("DELETE", "/api/v1/order", data, PRIORITY_HIGH)
+
+        if order_status is not None:
+            order_status = OrderStatus(order_status[0])
+
+        return order_status
+
+
+    async def _start_ws(self):
+        attempt = 0
+
+        while True:
+            opened_at = None
+
+            try:
+                async with self._session.ws_connect(self._wss_url, heartbeat=30) as ws:
+                    self._ws = ws
+                    opened_at = time.time()
+                    await self._on_open(ws)
+
+                    while True:
+                        # a connection without any data for too long is dead even if the socket is still open
+                        msg = await ws.receive(timeout=WS_STALE_TIMEOUT)
+
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            self._on_message(ws, msg.data)
+                        elif msg.type == aiohttp.WSMsgType.ERROR:
+                            self._on_error(ws, str(ws.exception()))
+                            break
+                        elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED):
+                            break
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                logger.warning(f"Bitmex received no data for {WS_STALE_TIMEOUT} seconds, reconnecting")
+            except Exception as e:
+                logger.error(f"Bitmex error in websocket connection: {e}")
+
+            self._on_close(self._ws)
+            self._ws = None
+
+            if opened_at is not None and time.time() - opened_at >= WS_STABLE_AFTER:
+                attempt = 0
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+
+    async def _on_open(self, ws):
+        logger.info("Bitmex websocket connection opened")
+
+        await self.subscribe_channel("instrument")
+
+
+    def _on_close(self, ws):
+        logger.warning("Bitmex websocket connection closed")
+
+
+    def _on_error(self, ws, msg: str):
+        logger.error(f"Bitmex websocket connection error: {msg}")
+
+
+    def _on_message(self, ws, msg: str):
+        data = codec.loads(msg)
+
+        if "table" in data:
+            if data['table'] == "instrument":
+                for d in data['data']:
+                    symbol = d['symbol']
+                    if symbol not in self.prices:
+                        self.prices[symbol] = { 'bid': None, 'ask': None }
+                    if 'bidPrice' in d:
+                        self.prices[symbol]['bid'] = d['bidPrice']
+                    if 'askPrice' in d:
+                        self.prices[symbol]['ask'] = d['askPrice']
+
+
+    async def subscribe_channel(self, topic: str):
+        data = dict()
+        data['op'] = "subscribe"
+        data['args'] = []
+        data['args'].append(topic)
+
+        try:
+            await self._ws.send_str(codec.dumps(data))
+        except Exception as e:
+            logger.error(f"Websocket error while subscribing to {topic} updates: {e}")
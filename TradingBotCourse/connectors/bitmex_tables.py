@@ -0,0 +1,111 @@
+import logging
+import typing
+
+logger = logging.getLogger()
+
+# same bound as the BitMEX reference client for the tables that only grow (executions, orders)
+MAX_TABLE_ROWS = 200
+
+
+# https://www.bitmex.com/app/wsAPI#Response-Format
+# One table of the BitMEX realtime API: the "partial" message gives the rows and the columns that identify them,
+# "insert", "update" and "delete" messages are then applied in place on the rows indexed by those keys
+class BitmexTable:
+    def __init__(self, name: str, keys=None, max_rows=None, evictable=None):
+        self.name = name
+        self.keys = keys if keys is not None else []
+        self.rows = dict()  # tuple of the key values -> row, in insertion order
+        self.ready = False  # True once the partial has been received
+
+        # above max_rows the oldest rows are dropped, only those for which evictable(row) is True when it is given
+        self.max_rows = max_rows
+        self._evictable = evictable
+
+        self._callbacks = []
+
+    def add_callback(self, callback: typing.Callable):
+        # called with (table, action, rows) after the rows have been applied, rows are the stored rows
+        self._callbacks.append(callback)
+
+    def _key(self, row: typing.Dict) -> typing.Tuple:
+        return tuple(row.get(k) for k in self.keys)
+
+    def get(self, *key):
+        return self.rows.get(key)
+
+    def apply(self, action: str, data: typing.List[typing.Dict], keys=None, filter=None):
+        if action == "partial":
+            if keys:
+                self.keys = keys
+            self._clear(filter)
+            self.ready = True
+
+        changed = []
+
+        if action == "delete":
+            for row in data:
+                deleted = self.rows.pop(self._key(row), None)
+                changed.append(deleted if deleted is not None else row)
+        else:
+            for row in data:
+                key = self._key(row)
+                stored = self.rows.get(key)
+                # updates only carry the keys and the fields that changed
+                if action == "update":
+                    if stored is None:
+                        continue  # row unknown (not in the partial), a key-only row would be useless
+                    stored.update(row)
+                else:
+                    self.rows[key] = stored = row
+                changed.append(stored)
+
+            if self.max_rows is not None and len(self.rows) > self.max_rows:
+                self._trim()
+
+        for callback in self._callbacks:
+            try:
+                callback(self, action, changed)
+            except Exception as e:
+                logger.error(f"Error in Bitmex {self.name} table callback: {e}")
+
+    def _clear(self, filter=None):
+        # a partial only replaces the rows of its subscription: with orderBookL2:XBTUSD and orderBookL2:ETHUSD
+        # the ETHUSD partial comes with filter {'symbol': "ETHUSD"} and must not drop the XBTUSD rows
+        if not filter:
+            self.rows.clear()
+            return
+
+        for key in [k for k, row in self.rows.items() if all(row.get(f) == v for f, v in filter.items())]:
+            del self.rows[key]
+
+    def _trim(self):
+        excess = len(self.rows) - self.max_rows
+        for key in list(self.rows):
+            if excess <= 0:
+                break
+            if self._evictable is None or self._evictable(self.rows[key]):
+                del self.rows[key]
+                excess -= 1
+
+
+class BitmexTableStore:
+    def __init__(self):
+        self._tables = dict()
+
+    def table(self, name: str, keys=None, max_rows=None, evictable=None) -> BitmexTable:
+        if name not in self._tables:
+            self._tables[name] = BitmexTable(name, keys, max_rows, evictable)
+
+        return self._tables[name]
+
+    def on_change(self, name: str, callback: typing.Callable, keys=None, max_rows=None, evictable=None):
+        self.table(name, keys, max_rows, evictable).add_callback(callback)
+
+    def reset(self):
+        # after a reconnection every table waits for its new partial, the rows are kept until then
+        for table in self._tables.values():
+            table.ready = False
+
+    def apply_message(self, data: typing.Dict):
+        table = self.table(data['table'])
+        table.apply(data.get('action', "update"), data['data'], data.get('keys'), data.get('filter'))
@@ -0,0 +1,180 @@
+import logging
+import time
+import datetime
+
+import threading
+
+from connectors.candle_series import CandleSeries
+
+logger = logging.getLogger()
+
+MINUTE_MS = 60 * 1000
+WEEK_MS = 7 * 24 * 60 * MINUTE_MS
+WEEK_OFFSET_MS = 4 * 24 * 60 * MINUTE_MS  # 1970-01-01 was a Thursday, weekly candles open on Mondays
+
+
+def bar_open_time(timestamp: int, interval: str, minutes: int) -> int:
+    # open time (Unix ms) of the bar containing timestamp
+    if interval == "1M":
+        d = datetime.datetime.utcfromtimestamp(timestamp / 1000)
+        return int(datetime.datetime(d.year, d.month, 1, tzinfo=datetime.timezone.utc).timestamp() * 1000)
+    elif interval == "1w":
+        return timestamp - (timestamp - WEEK_OFFSET_MS) % WEEK_MS
+
+    return timestamp - timestamp % (minutes * MINUTE_MS)
+
+
+def next_bar_time(open_time: int, interval: str, minutes: int) -> int:
+    if interval == "1M":
+        d = datetime.datetime.utcfromtimestamp(open_time / 1000)
+        year, month = (d.year + 1, 1) if d.month == 12 else (d.year, d.month + 1)
+        return int(datetime.datetime(year, month, 1, tzinfo=datetime.timezone.utc).timestamp() * 1000)
+
+    return open_time + minutes * MINUTE_MS
+
+
+# Live candles of one symbol and timeframe built from the trade stream. It continues the CandleSeries returned by
+# get_historical_candles: trades update the last bar in place and a new one is appended when a trade falls
+# after the boundary. Exchange candles (kline, tradeBin) overwrite the built values with the official ones.
+class CandleBuilder:
+    def __init__(self, symbol: str, interval: str, minutes: int, candles: CandleSeries, on_close=None):
+        self.symbol = symbol
+        self.interval = interval
+        self.candles = candles
+
+        self._minutes = minutes  # 0 for the monthly timeframe
+        self._on_close = on_close  # function(builder, closed candle)
+
+        self._lock = threading.Lock()
+        self._set_history(candles)
+
+    def _set_history(self, candles: CandleSeries):
+        self.candles = candles
+        timestamps = candles.timestamps
+        self._last_closed = int(timestamps[-2]) if len(timestamps) > 1 else None
+        self._next_open = next_bar_time(int(timestamps[-1]), self.interval, self._minutes) if len(timestamps) > 0 else None
+
+    def load_history(self, candles: CandleSeries):
+        # replaces the whole series (replay of the history recorded with the subscription), builder.candles is a new object
+        with self._lock:
+            self._set_history(candles)
+
+    @property
+    def next_close_time(self):
+        if self._next_open is not None and self._current_closed():
+            return next_bar_time(self._next_open, self.interval, self._minutes)  # end of the next flat bar
+        return self._next_open
+
+    def _current_closed(self) -> bool:
+        return self._last_closed is not None and self.candles.last_timestamp() <= self._last_closed
+
+    def on_trade(self, timestamp: int, price: float, quantity: float):
+        with self._lock:
+            if self._next_open is not None and timestamp < self._next_open:
+                if timestamp < self.candles.last_timestamp():
+                    return  # late trade of a bar already closed
+            else:
+                self._start_bar(bar_open_time(timestamp, self.interval, self._minutes), price)
+
+            self.candles.add_trade(price, quantity)
+
+    def on_bar(self, open_time: int, open_price: float, high: float, low: float, close: float, volume: float, closed: bool):
+        with self._lock:
+            if len(self.candles) > 0 and open_time < self.candles.last_timestamp():
+                # the final values of a bar (tradeBin, kline x=true) usually arrive after a trade already started the
+                # next bar: they replace the values built from the trades. Its close was already emitted.
+                i = self.candles.index_of(open_time)
+                if i is not None:
+                    self.candles.update_at(i, open_price, high, low, close, volume)
+                return
+
+            if self._next_open is None or open_time >= self._next_open:
+                self._start_bar(open_time, open_price)
+
+            self.candles.update_last(open_price, high, low, close, volume)
+
+            if closed:
+                self._emit_close()
+
+    def check_clock(self, now: int):
+        # closes the current bar as soon as its period is over, even if no trade came after it. The periods without
+        # any trade get a flat bar, appended and closed at their own end, so an idle market still closes on time.
+        with self._lock:
+            while self._next_open is not None and now >= self._next_open:
+                if not self._current_closed():
+                    self._emit_close()
+                    continue
+
+                next_close = next_bar_time(self._next_open, self.interval, self._minutes)
+                if now < next_close:
+                    break
+
+                last_close = self.candles.last_close()
+                self.candles.append_bar(self._next_open, last_close, last_close, last_close, last_close, 0.0)
+                self._next_open = next_close
+                self._emit_close()
+
+    def _start_bar(self, open_time: int, price: float):
+        candles = self.candles
+
+        if len(candles) > 0:
+            self._emit_close()
+
+            # periods without any trade that the clock did not fill yet (paused, or a replay) get flat candles
+            last_close = candles.last_close()
+            gap_open = next_bar_time(candles.last_timestamp(), self.interval, self._minutes)
+            while gap_open < open_time:
+                candles.append_bar(gap_open, last_close, last_close, last_close, last_close, 0.0)
+                self._emit_close()
+                gap_open = next_bar_time(gap_open, self.interval, self._minutes)
+
+        candles.append_bar(open_time, price, price, price, price, 0.0)
+        self._next_open = next_bar_time(open_time, self.interval, self._minutes)
+
+    def _emit_close(self):
+        # the last bar of the series is the one closing
+        open_time = self.candles.last_timestamp()
+        if self._last_closed is not None and open_time <= self._last_closed:
+            return
+        self._last_closed = open_time
+
+        if self._on_close is not None:
+            try:
+                self._on_close(self, self.candles[-1])
+            except Exception as e:
+                logger.error(f"Error in {self.symbol} {self.interval} candle close callback: {e}")
+
+
+# One thread per client that wakes up at the next bar boundary of all its builders. It is paused during a replay:
+# the bars are then only closed by the timestamps of the replayed trades and bars, not by the wall clock.
+class CandleClock:
+    def __init__(self):
+        self._builders = []
+        self._event = threading.Event()
+        self._thread = None
+        self.paused = False
+
+    def add(self, builder: CandleBuilder):
+        self._builders.append(builder)
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self._event.set()
+
+    def remove(self, builder: CandleBuilder):
+        if builder in self._builders:
+            self._builders.remove(builder)
+
+    def _run(self):
+        while True:
+            now = int(time.time() * 1000)
+            if not self.paused:
+                for builder in list(self._builders):
+                    builder.check_clock(now)
+
+            upcoming = [b.next_close_time for b in self._builders if b.next_close_time is not None and b.next_close_time > now]
+            wait = (min(upcoming) - now) / 1000 if len(upcoming) > 0 else 1.0
+
+            self._event.wait(timeout=min(max(wait, 0.001), 1.0))
+            self._event.clear()
@@ -0,0 +1,169 @@
+import typing
+
+import numpy as np
+
+from collections.abc import Sequence
+
+CANDLE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(len(CANDLE_COLUMNS))
+
+
+# Candles of one symbol and timeframe as columns: Unix ms timestamps in an int64 array and open, high, low, close,
+# volume in one float64 block stored column by column, so every column is a contiguous array that indicators can use
+# directly. The capacity doubles when full, append is amortized O(1). Slices are views on the same memory.
+# It is also a Sequence of Candle objects built on access, for the code written against the former list of candles:
+# these objects are copies, changing them does not change the series.
+class CandleSeries(Sequence):
+    def __init__(self, timestamps=None, values=None, candle_factory=None, capacity: int = 0):
+        # timestamps: n Unix ms, values: (n, 5) open/high/low/close/volume, both are used without copy when possible
+        self._candle_factory = candle_factory  # function(timestamp, open, high, low, close, volume) -> Candle
+
+        if timestamps is None:
+            self._length = 0
+            self._timestamps = np.empty(capacity, dtype=np.int64)
+            self._values = np.empty((capacity, len(CANDLE_COLUMNS)), dtype=np.float64, order='F')
+        else:
+            self._length = len(timestamps)
+            self._timestamps = np.asarray(timestamps, dtype=np.int64)
+            self._values = np.asarray(values, dtype=np.float64).reshape(-1, len(CANDLE_COLUMNS))
+
+    @classmethod
+    def from_rows(cls, timestamps: typing.List[int], rows: typing.List, candle_factory=None):
+        # rows are sequences of open, high, low, close, volume as numbers or strings, converted by numpy in one call
+        if len(rows) == 0:
+            return cls(candle_factory=candle_factory)
+
+        values = np.asfortranarray(np.array(rows, dtype=np.float64).reshape(-1, len(CANDLE_COLUMNS)))
+        return cls(np.array(timestamps, dtype=np.int64), values, candle_factory)
+
+    # columns, views on the current buffer (an append that grows the buffer does not show in views taken before)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps[:self._length]
+
+    @property
+    def open(self) -> np.ndarray:
+        return self._values[:self._length, OPEN]
+
+    @property
+    def high(self) -> np.ndarray:
+        return self._values[:self._length, HIGH]
+
+    @property
+    def low(self) -> np.ndarray:
+        return self._values[:self._length, LOW]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self._values[:self._length, CLOSE]
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self._values[:self._length, VOLUME]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[:self._length]
+
+    def to_frame(self):
+        # DataFrame on the same memory as the series, indexed by the Unix ms timestamps
+        import pandas as pd  # only loaded by the code that needs it, the import is slow
+
+        return pd.DataFrame(self.values, index=pd.Index(self.timestamps, name="timestamp", copy=False),
+                            columns=list(CANDLE_COLUMNS), copy=False)
+
+    # Sequence
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            return CandleSeries(self._timestamps[start:stop:step], self._values[start:stop:step], self._candle_factory)
+
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("CandleSeries index out of range")
+
+        return self._candle(index)
+
+    def __iter__(self):
+        for i in range(self._length):
+            yield self._candle(i)
+
+    def _candle(self, i: int):
+        o, h, l, c, v = self._values[i].tolist()
+        return self._candle_factory(int(self._timestamps[i]), o, h, l, c, v)
+
+    # updates
+
+    def _grow(self, capacity: int):
+        timestamps = np.empty(capacity, dtype=np.int64)
+        timestamps[:self._length] = self._timestamps[:self._length]
+
+        values = np.empty((capacity, len(CANDLE_COLUMNS)), dtype=np.float64, order='F')
+        values[:self._length] = self._values[:self._length]
+
+        self._timestamps = timestamps
+        self._values = values
+
+    def append_bar(self, timestamp: int, open_price: float, high: float, low: float, close: float, volume: float):
+        if self._length == len(self._timestamps):
+            self._grow(max(2 * self._length, 16))
+
+        i = self._length
+        self._timestamps[i] = timestamp
+        self._values[i] = (open_price, high, low, close, volume)
+        self._length += 1
+
+    def append(self, candle):
+        self.append_bar(candle.timestamp, candle.open, candle.high, candle.low, candle.close, candle.volume)
+
+    def extend(self, candles: typing.Iterable):
+        for candle in candles:
+            self.append(candle)
+
+    def update_last(self, open_price=None, high=None, low=None, close=None, volume=None):
+        self.update_at(self._length - 1, open_price, high, low, close, volume)
+
+    def update_at(self, index: int, open_price=None, high=None, low=None, close=None, volume=None):
+        # fields left to None keep their value
+        row = self._values[index]
+        if open_price is not None:
+            row[OPEN] = open_price
+        if high is not None:
+            row[HIGH] = high
+        if low is not None:
+            row[LOW] = low
+        if close is not None:
+            row[CLOSE] = close
+        if volume is not None:
+            row[VOLUME] = volume
+
+    def add_trade(self, price: float, quantity: float):
+        # the last bar absorbs a trade
+        i = self._length - 1
+        values = self._values
+
+        if price > values[i, HIGH]:
+            values[i, HIGH] = price
+        elif price < values[i, LOW]:
+            values[i, LOW] = price
+        values[i, CLOSE] = price
+        values[i, VOLUME] += quantity
+
+    def index_of(self, timestamp: int):
+        # index of the bar opening at timestamp, None if there is none, binary search on the sorted timestamps
+        i = int(np.searchsorted(self.timestamps, timestamp))
+        if i < self._length and self._timestamps[i] == timestamp:
+            return i
+        return None
+
+    def last_timestamp(self):
+        return int(self._timestamps[self._length - 1]) if self._length > 0 else None
+
+    def last_close(self):
+        return float(self._values[self._length - 1, CLOSE]) if self._length > 0 else None
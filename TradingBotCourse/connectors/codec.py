@@ -0,0 +1,33 @@
+import json
+
+# JSON decoding used by every connector. orjson (or ujson) is used when installed, the standard library otherwise.
+# loads() accepts bytes as well as str so REST bodies are decoded straight from response.content.
+# pip install orjson
+try:
+    import orjson
+
+    CODEC_NAME = "orjson"
+
+    loads = orjson.loads
+
+    def dumps(data) -> str:
+        return orjson.dumps(data).decode()
+
+except ImportError:
+    try:
+        import ujson
+
+        CODEC_NAME = "ujson"
+
+        loads = ujson.loads
+
+        def dumps(data) -> str:
+            return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False)
+
+    except ImportError:
+        CODEC_NAME = "json"
+
+        loads = json.loads
+
+        def dumps(data) -> str:
+            return json.dumps(data, separators=(",", ":"))
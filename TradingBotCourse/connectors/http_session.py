@@ -0,0 +1,106 @@
+import logging
+import requests
+import time
+import typing
+import functools
+import threading
+
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger()
+
+
+# Connection pools that drop a kept-alive connection left unused for more than max_idle seconds when it is taken
+# out of the pool: the server or a load balancer has usually closed it already and the request would fail on it.
+# The connection is closed and urllib3 opens a new one, the other connections of the pool are not affected.
+class _IdleTimeoutMixin:
+    def __init__(self, *args, max_idle: float = None, **kwargs):
+        self.max_idle = max_idle
+        super().__init__(*args, **kwargs)
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+
+        last_used = getattr(conn, 'last_used', None)
+        if self.max_idle is not None and last_used is not None and time.time() - last_used > self.max_idle:
+            logger.info(f"Closing a connection to {self.host} idle for {time.time() - last_used:.0f} seconds")
+            conn.close()
+
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn.last_used = time.time()
+        super()._put_conn(conn)
+
+
+class _IdleTimeoutHTTPConnectionPool(_IdleTimeoutMixin, HTTPConnectionPool):
+    pass
+
+
+class _IdleTimeoutHTTPSConnectionPool(_IdleTimeoutMixin, HTTPSConnectionPool):
+    pass
+
+
+class _IdleTimeoutAdapter(HTTPAdapter):
+    def __init__(self, max_idle: float, **kwargs):
+        self._max_idle = max_idle  # read by init_poolmanager, which HTTPAdapter.__init__ calls
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': functools.partial(_IdleTimeoutHTTPConnectionPool, max_idle=self._max_idle),
+            'https': functools.partial(_IdleTimeoutHTTPSConnectionPool, max_idle=self._max_idle),
+        }
+
+
+# One requests.Session per client: connections are kept alive and reused by every REST call
+# instead of paying a new TCP + TLS handshake for each request
+class PooledSession:
+    def __init__(self, base_url: str, pool_size: int = 10, max_idle: float = 60.0):
+        self._base_url = base_url
+        self._pool_size = pool_size
+        self._max_idle = max_idle  # seconds a pooled connection may stay unused before being dropped
+
+        self._session = self._new_session()
+
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        session.headers['Connection'] = "keep-alive"
+
+        adapter = _IdleTimeoutAdapter(self._max_idle, pool_connections=1, pool_maxsize=self._pool_size, pool_block=False)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return session
+
+
+    def warm_up(self, request: typing.Callable, connections: int = 1):
+        # open the connections up front so the first order does not pay for the handshake. request() is a call of
+        # the client's own request path, so the pings are counted by its rate limiter like any other request
+        threads = []
+        for _ in range(min(connections, self._pool_size)):
+            t = threading.Thread(target=self._warm_up_connection, args=(request,))
+            t.start()
+            threads.append(t)
+
+        for t in threads:
+            t.join()
+
+
+    def _warm_up_connection(self, request: typing.Callable):
+        try:
+            request()
+        except Exception as e:
+            logger.warning(f"Could not warm up connection to {self._base_url}: {e}")
+
+
+    def request(self, method: str, endpoint: str, params=None, headers=None) -> requests.Response:
+        return self._session.request(method, f"{self._base_url}{endpoint}", params=params, headers=headers)
+
+
+    def close(self):
+        self._session.close()
@@ -0,0 +1,114 @@
+import logging
+import time
+import typing
+import queue
+
+import threading
+
+logger = logging.getLogger()
+
+# what put() does when the queue of a worker is full
+OVERFLOW_BLOCK = "block"  # wait for room, the websocket reader slows down (no data lost)
+OVERFLOW_DROP_NEWEST = "drop_newest"  # discard the incoming frame
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # discard the oldest queued frame, keeps the freshest data
+
+
+def field_value(msg: str, field: str):
+    # value of a string field found by scanning the raw frame, without decoding the whole message
+    marker = f'"{field}":"'
+    start = msg.find(marker)
+    if start == -1:
+        return None
+
+    start += len(marker)
+    return msg[start:msg.find('"', start)]
+
+
+# The websocket reader thread only timestamps and queues the raw frames, decoding and dispatching is done
+# by worker threads. Frames with the same key (symbol, table...) always go to the same worker so they are
+# processed in the order they were received.
+class IngestPipeline:
+    def __init__(self, name: str, handler: typing.Callable, key_func=None, workers: int = 1, max_queue: int = 10000,
+                 overflow: str = OVERFLOW_BLOCK):
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST):
+            raise ValueError(f"Unknown overflow policy {overflow}")
+
+        self._name = name
+        self._handler = handler  # called with (msg, receive time)
+        self._key_func = key_func
+        self._overflow = overflow
+
+        self._queues = [queue.Queue(maxsize=max_queue) for _ in range(workers)]
+
+        self._received = 0
+        self._dropped = 0
+        self._latency_sum = 0.0
+        self._latency_count = 0
+        self._latency_max = 0.0
+        self._stats_lock = threading.Lock()
+
+        for i in range(workers):
+            t = threading.Thread(target=self._worker, args=(self._queues[i],), daemon=True)
+            t.start()
+
+    def put(self, msg: str, receive_time=None):
+        item = (receive_time if receive_time is not None else time.time(), msg)
+
+        if len(self._queues) == 1 or self._key_func is None:
+            q = self._queues[0]
+        else:
+            q = self._queues[hash(self._key_func(msg)) % len(self._queues)]
+
+        self._received += 1
+
+        if self._overflow == OVERFLOW_BLOCK:
+            q.put(item)
+            return
+
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            self._dropped += 1
+            if self._overflow == OVERFLOW_DROP_OLDEST:
+                try:
+                    q.get_nowait()
+                    q.task_done()
+                    q.put_nowait(item)
+                except (queue.Empty, queue.Full):
+                    pass  # another reader thread took the freed slot, this frame is dropped instead
+
+    def _worker(self, q: queue.Queue):
+        while True:
+            receive_time, msg = q.get()
+
+            try:
+                self._handler(msg, receive_time)
+            except Exception as e:
+                logger.error(f"{self._name} error while processing websocket message: {e}")
+
+            latency = time.time() - receive_time
+            with self._stats_lock:
+                self._latency_sum += latency
+                self._latency_count += 1
+                self._latency_max = max(self._latency_max, latency)
+
+            q.task_done()
+
+    def join(self):
+        # blocks until every queued frame has been processed
+        for q in self._queues:
+            q.join()
+
+    def metrics(self) -> typing.Dict:
+        with self._stats_lock:
+            metrics = {'queue_depth': [q.qsize() for q in self._queues], 'received': self._received,
+                       'dropped': self._dropped,
+                       'avg_latency_ms': self._latency_sum / self._latency_count * 1000 if self._latency_count > 0 else None,
+                       'max_latency_ms': self._latency_max * 1000}
+
+            # latency figures cover the period since the previous call
+            self._latency_sum = 0.0
+            self._latency_count = 0
+            self._latency_max = 0.0
+
+        return metrics
@@ -0,0 +1,101 @@
+import time
+import typing
+
+import threading
+
+import numpy as np
+
+LATENCY_EDGES_MS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+# Last `size` samples in a numpy ring buffer, percentiles and bucket counts are computed on demand
+class RollingHistogram:
+    def __init__(self, size: int = 10000):
+        self._values = np.zeros(size, dtype=np.float64)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def add(self, value: float):
+        with self._lock:
+            self._values[self._count % len(self._values)] = value
+            self._count += 1
+
+    def samples(self) -> np.ndarray:
+        with self._lock:
+            return self._values[:min(self._count, len(self._values))].copy()
+
+    def summary(self) -> typing.Dict:
+        values = self.samples()
+        if len(values) == 0:
+            return {'count': 0}
+
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+
+        return {'count': len(values), 'mean': float(values.mean()), 'p50': float(p50), 'p90': float(p90),
+                'p99': float(p99), 'max': float(values.max())}
+
+    def histogram(self, edges=LATENCY_EDGES_MS) -> typing.List[typing.Tuple[float, int]]:
+        # (lower edge, count) of every bucket, the last bucket holds everything above the last edge
+        counts, _ = np.histogram(self.samples(), bins=list(edges) + [np.inf])
+        return list(zip(edges, counts.tolist()))
+
+
+# Timing of the quote updates of one client. For every update three clocks are kept:
+# exchange event time -> local receive time (network) -> dispatch time, once the price board is updated (ingest).
+# The exchange clock is only as good as the local clock synchronization, ages measured from the receive time
+# do not depend on it.
+class LatencyMonitor:
+    def __init__(self, name: str, size: int = 10000):
+        self.name = name
+        self.network = RollingHistogram(size)  # ms from the exchange event to the websocket receive
+        self.ingest = RollingHistogram(size)  # ms from the websocket receive to the dispatch
+        self.total = RollingHistogram(size)  # ms from the exchange event to the dispatch
+
+        self._last = dict()  # symbol -> (exchange time ms, receive time ms, dispatch time ms)
+
+    def record(self, symbol: str, exchange_time, receive_time: float, dispatch_time=None):
+        # receive and dispatch times in seconds (time.time()), exchange time in Unix ms or None if unknown
+        if dispatch_time is None:
+            dispatch_time = time.time()
+
+        receive_ms = receive_time * 1000
+        dispatch_ms = dispatch_time * 1000
+
+        self.ingest.add(dispatch_ms - receive_ms)
+        if exchange_time is not None:
+            self.network.add(receive_ms - exchange_time)
+            self.total.add(dispatch_ms - exchange_time)
+
+        self._last[symbol] = (exchange_time, receive_ms, dispatch_ms)
+
+    def last_update(self, symbol: str):
+        return self._last.get(symbol)
+
+    def ages(self, symbol: str, now=None) -> typing.Dict:
+        # milliseconds elapsed since the last update of the symbol was produced, received and dispatched
+        last = self._last.get(symbol)
+        if last is None:
+            return None
+
+        now_ms = (now if now is not None else time.time()) * 1000
+        exchange_time, receive_ms, dispatch_ms = last
+
+        return {'exchange': now_ms - exchange_time if exchange_time is not None else None,
+                'receive': now_ms - receive_ms, 'dispatch': now_ms - dispatch_ms}
+
+    def is_fresh(self, symbol: str, max_age_ms: float) -> bool:
+        # the age of the quote itself when the exchange timestamped it, the time since it was received otherwise
+        ages = self.ages(symbol)
+        if ages is None:
+            return False
+
+        age = ages['exchange'] if ages['exchange'] is not None else ages['receive']
+        return age <= max_age_ms
+
+    def metrics(self) -> typing.Dict:
+        now = time.time()
+        ages = [now * 1000 - last[1] for last in list(self._last.values())]
+
+        return {'name': self.name, 'network_ms': self.network.summary(), 'ingest_ms': self.ingest.summary(),
+                'total_ms': self.total.summary(), 'symbols': len(ages),
+                'max_receive_age_ms': max(ages) if len(ages) > 0 else None}
@@ -1,4 +1,23 @@
+from connectors.candle_series import CandleSeries
+from connectors.ticks import TickScale, ContractRounding, ROUND_NEAREST, ROUND_FLOOR, ROUND_CEIL
+
+# https://binance-docs.github.io/apidocs/futures/en/#public-endpoints-info
+BINANCE_TF_MINUTES = { '1m': 1, '3m': 3, '5m': 5, '15m': 15, '30m': 30, '1h': 60, '2h': 120, '4h': 240, '6h': 360, '8h': 480, '12h': 720, '1d': 1440, '3d': 4320, '1w': 10080 }
+
+# maximum number of orders accepted by one /fapi/v1/batchOrders request
+BINANCE_MAX_BATCH_ORDERS = 5
+BINANCE_MAX_BATCH_CANCELS = 10
+
+# an order in one of these states does not change anymore
+BINANCE_FINAL_ORDER_STATUSES = frozenset(("FILLED", "CANCELED", "EXPIRED", "EXPIRED_IN_MATCH", "REJECTED"))
+
+# finished orders kept by the client's order cache, the oldest ones are forgotten first
+BINANCE_MAX_CACHED_FINAL_ORDERS = 1000
+
+# __slots__ models: no per-instance __dict__, which matters when hundreds of thousands of candles are loaded.
 class Balance:
+    __slots__ = ('initial_margin', 'maintenance_margin', 'margin_balance', 'wallet_balance', 'unrealized_pnl')
+
     def __init__(self, info):
         self.initial_margin = float(info['initialMargin'])
         self.maintenance_margin = float(info['maintMargin'])
@@ -7,6 +26,8 @@ class Balance:
         self.unrealized_pnl = float(info['unrealizedProfit'])
 
 class Candle:
+    __slots__ = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
     def __init__(self, candle_info, timeframe):
         self.timestamp = candle_info[0]
         self.open = float(candle_info[1])
@@ -15,19 +36,54 @@ class Candle:
         self.close = float(candle_info[4])
         self.volume = float(candle_info[5])
 
-class Contract:
+    @classmethod
+    def from_values(cls, timestamp: int, open_price: float, high: float, low: float, close: float, volume: float):
+        candle = cls.__new__(cls)
+        candle.timestamp = timestamp
+        candle.open = open_price
+        candle.high = high
+        candle.low = low
+        candle.close = close
+        candle.volume = volume
+        return candle
+
+    @classmethod
+    def series_from_rows(cls, rows) -> CandleSeries:
+        # raw /fapi/v1/klines rows [open time, "open", "high", "low", "close", "volume", ...] straight into the columns
+        # of a CandleSeries, without any Candle object, the price strings are parsed by numpy
+        rows = list(rows)
+        return CandleSeries.from_rows([row[0] for row in rows], [row[1:6] for row in rows], cls.from_values)
+
+class Contract(ContractRounding):
+    __slots__ = ('symbol', 'base_asset', 'quote_asset', 'price_decimals', 'quantity_decimals', 'tick_size', 'lot_size',
+                 'price_scale', 'quantity_scale')
+
     def __init__(self, contract_info):
         self.symbol = contract_info['symbol']
         self.base_asset = contract_info['baseAsset']
         self.quote_asset = contract_info['quoteAsset']
         self.price_decimals = contract_info['pricePrecision']
         self.quantity_decimals = contract_info['quantityPrecision']
-        self.tick_size = 1 / pow(10, contract_info['pricePrecision'])
-        self.lot_size = 1 / pow(10, contract_info['quantityPrecision'])
+
+        # prices and quantities as int numbers of ticks / lots. The valid steps are given by the filters, the
+        # precisions are only the number of decimals accepted (BTCUSDT: pricePrecision 2 but a 0.10 tickSize)
+        filters = {f['filterType']: f for f in contract_info.get('filters', [])}
+        if 'PRICE_FILTER' in filters:
+            self.price_scale = TickScale(filters['PRICE_FILTER']['tickSize'])
+        else:
+            self.price_scale = TickScale.from_decimals(contract_info['pricePrecision'])
+        if 'LOT_SIZE' in filters:
+            self.quantity_scale = TickScale(filters['LOT_SIZE']['stepSize'])
+        else:
+            self.quantity_scale = TickScale.from_decimals(contract_info['quantityPrecision'])
+
+        self.tick_size = self.price_scale.step
+        self.lot_size = self.quantity_scale.step
 
 class OrderStatus:
+    __slots__ = ('order_id', 'status', 'avg_price')
+
     def __init__(self, order_info):
         self.order_id = order_info['orderId']
         self.status = order_info['status']
         self.avg_price = float(order_info['avgPrice'])
-        
\ No newline at end of file
@@ -1,23 +1,36 @@
 import dateutil.parser
 import datetime
 
+import numpy as np
+
+from connectors.candle_series import CandleSeries
+from connectors.ticks import TickScale, step_decimals, ContractRounding, ROUND_NEAREST, ROUND_FLOOR, ROUND_CEIL
+
 # convert from satatoshi to bitcoin
 BITMEX_MULTIPLIER = 0.00000001
 BITMEX_TF_MINUTES = { '1m': 1, '5m': 5, '1h': 60, '1d': 1440 }
 
+# https://www.bitmex.com/app/wsAPI#Subscriptions
+BITMEX_PRIVATE_TABLE_KEYS = { 'order': ['orderID'], 'execution': ['execID'], 'margin': ['account', 'currency'], 'position': ['account', 'symbol', 'currency'] }
+BITMEX_CLOSED_ORDER_STATUSES = ('Filled', 'Canceled', 'Rejected')
+
 def tick_to_decimals(tick_size: float) -> int:
-    tick_size_str = "{0:.8f}".format(tick_size)
-    while tick_size_str[-1] == "0":
-        tick_size_str = tick_size_str[:-1]
+    return step_decimals(tick_size)
 
-    split_tick = tick_size_str.split(".")
+def ms_to_iso(timestamp: int) -> str:
+    return datetime.datetime.utcfromtimestamp(timestamp / 1000).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
 
-    if len(split_tick) > 1:
-        return len(split_tick[1])
-    else:
-        return 0
+def iso_to_ms(timestamp: str) -> int:
+    return int(datetime.datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp() * 1000)
 
+def iso_to_ms_array(timestamps) -> np.ndarray:
+    # a whole column of BitMEX UTC timestamps parsed by numpy in one pass, datetime64 does not accept the "Z"
+    return np.array([t.rstrip("Z") for t in timestamps], dtype='datetime64[ms]').view(np.int64)
+
+# slotted like the Binance models
 class Balance:
+    __slots__ = ('initial_margin', 'maintenance_margin', 'margin_balance', 'wallet_balance', 'unrealized_pnl')
+
     def __init__(self, info):
         self.initial_margin = info['initMargin'] * BITMEX_MULTIPLIER
         self.maintenance_margin = info['maintMargin'] * BITMEX_MULTIPLIER
@@ -26,6 +39,8 @@ class Balance:
         self.unrealized_pnl = info['unrealisedPnl'] * BITMEX_MULTIPLIER
 
 class Candle:
+    __slots__ = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
     def __init__(self, candle_info, timeframe):
         self.timestamp = dateutil.parser.isoparse(candle_info['timestamp'])
         self.timestamp = self.timestamp - datetime.timedelta(minutes=BITMEX_TF_MINUTES[timeframe])
@@ -36,19 +51,46 @@ class Candle:
         self.close = float(candle_info['close'])
         self.volume = float(candle_info['volume'])
 
-class Contract:
+    @classmethod
+    def from_values(cls, timestamp: int, open_price: float, high: float, low: float, close: float, volume: float):
+        candle = cls.__new__(cls)
+        candle.timestamp = timestamp
+        candle.open = open_price
+        candle.high = high
+        candle.low = low
+        candle.close = close
+        candle.volume = volume
+        return candle
+
+    @classmethod
+    def series_from_rows(cls, rows, timeframe: str) -> CandleSeries:
+        rows = list(rows)
+        timestamps = iso_to_ms_array([row['timestamp'] for row in rows]) - BITMEX_TF_MINUTES[timeframe] * 60 * 1000
+        return CandleSeries.from_rows(timestamps,
+                                      [(row['open'], row['high'], row['low'], row['close'], row['volume']) for row in rows],
+                                      cls.from_values)
+
+class Contract(ContractRounding):
+    __slots__ = ('symbol', 'base_asset', 'quote_asset', 'price_decimals', 'quantity_decimals', 'tick_size', 'lot_size',
+                 'price_scale', 'quantity_scale')
+
     def __init__(self, contract_info):
         self.symbol = contract_info['symbol']
         self.base_asset = contract_info['rootSymbol']
         self.quote_asset = contract_info['quoteCurrency']
-        self.price_decimals = tick_to_decimals(contract_info['tickSize'])
-        self.quantity_decimals = tick_to_decimals(contract_info['lotSize'])
         self.tick_size = contract_info['tickSize']
         self.lot_size = contract_info['lotSize']
 
+        # prices and quantities as int numbers of ticks / lots, the tick size is not always a power of ten (0.5 on XBTUSD)
+        self.price_scale = TickScale(contract_info['tickSize'])
+        self.quantity_scale = TickScale(contract_info['lotSize'])
+        self.price_decimals = self.price_scale.decimals
+        self.quantity_decimals = self.quantity_scale.decimals
+
 class OrderStatus:
+    __slots__ = ('order_id', 'status', 'avg_price')
+
     def __init__(self, order_info):      
         self.order_id = order_info['orderID']
         self.status = order_info['ordStatus']
-        self.avg_price = float(order_info['avgPx'])
-        
\ No newline at end of file
+        self.avg_price = float(order_info['avgPx']) if order_info.get('avgPx') is not None else 0.0
@@ -0,0 +1,242 @@
+import logging
+import time
+import typing
+import bisect
+
+import threading
+
+logger = logging.getLogger()
+
+
+# One side of a book: quantities by price plus the sorted list of prices. Finding a level is a binary search,
+# the best price is the first or last element of the list.
+class BookSide:
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self._levels = dict()  # price -> quantity
+        self._prices = []  # ascending
+
+    def __len__(self) -> int:
+        return len(self._prices)
+
+    def clear(self):
+        self._levels.clear()
+        self._prices.clear()
+
+    def set(self, price: float, quantity: float):
+        # a quantity of 0 removes the level
+        if quantity == 0:
+            if self._levels.pop(price, None) is not None:
+                del self._prices[bisect.bisect_left(self._prices, price)]
+        else:
+            if price not in self._levels:
+                bisect.insort(self._prices, price)
+            self._levels[price] = quantity
+
+    def best(self):
+        if len(self._prices) == 0:
+            return None
+
+        price = self._prices[-1] if self.is_bid else self._prices[0]
+        return price, self._levels[price]
+
+    def top(self, n: int) -> typing.List[typing.Tuple[float, float]]:
+        prices = self._prices[:-n - 1:-1] if self.is_bid else self._prices[:n]
+        return [(p, self._levels[p]) for p in prices]
+
+    def quantity_to_price(self, limit_price: float) -> float:
+        # cumulative quantity of the levels at limit_price or better
+        if self.is_bid:
+            prices = self._prices[bisect.bisect_left(self._prices, limit_price):]
+        else:
+            prices = self._prices[:bisect.bisect_right(self._prices, limit_price)]
+
+        return sum(self._levels[p] for p in prices)
+
+    def cumulative(self, n: int) -> typing.List[typing.Tuple[float, float]]:
+        total = 0.0
+        levels = []
+        for price, quantity in self.top(n):
+            total += quantity
+            levels.append((price, total))
+
+        return levels
+
+    def average_price(self, quantity: float):
+        # average fill price of a market order of this size taking liquidity from this side, None if the book is too thin
+        remaining = quantity
+        cost = 0.0
+
+        prices = reversed(self._prices) if self.is_bid else iter(self._prices)
+        for price in prices:
+            filled = min(remaining, self._levels[price])
+            cost += filled * price
+            remaining -= filled
+            if remaining <= 0:
+                return cost / quantity
+
+        return None
+
+
+class OrderBook:
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids = BookSide(True)
+        self.asks = BookSide(False)
+        self.last_update_id = None
+        self.timestamp = None
+        self.synced = False
+
+    def clear(self):
+        self.bids.clear()
+        self.asks.clear()
+        self.synced = False
+
+    def best_bid(self):
+        return self.bids.best()
+
+    def best_ask(self):
+        return self.asks.best()
+
+    def mid_price(self):
+        bid = self.bids.best()
+        ask = self.asks.best()
+        if bid is None or ask is None:
+            return None
+
+        return (bid[0] + ask[0]) / 2
+
+    def top(self, n: int) -> typing.Tuple[typing.List, typing.List]:
+        return self.bids.top(n), self.asks.top(n)
+
+
+# https://binance-docs.github.io/apidocs/futures/en/#how-to-manage-a-local-order-book-correctly
+# Depth diffs are buffered until a REST snapshot is loaded, then applied as long as each event's pu matches the
+# previous event's u. Any gap clears the book and starts again from a new snapshot.
+class BinanceBookSync:
+    def __init__(self, book: OrderBook, fetch_snapshot=None):
+        self.book = book
+        self._fetch_snapshot = fetch_snapshot  # function() -> /fapi/v1/depth response or None, None when snapshots are pushed with load_snapshot()
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._awaiting_first = True
+        self._resyncing = False
+
+    def on_event(self, data: typing.Dict):
+        with self._lock:
+            if not self.book.synced:
+                self._buffer.append(data)
+                self._start_resync()
+                return
+
+            if not self._apply(data):
+                logger.warning(f"Binance {self.book.symbol} depth update gap, the order book is resynchronized")
+                self.book.clear()
+                self._buffer = [data]
+                self._start_resync()
+
+    def resync(self):
+        # after a websocket reconnection the diffs in between are lost, the book is rebuilt from a new snapshot
+        with self._lock:
+            self.book.clear()
+            self._buffer = []
+            self._start_resync()
+
+    def load_snapshot(self, snapshot: typing.Dict) -> bool:
+        # used by the replay, snapshots come from the tape instead of REST
+        with self._lock:
+            if not self._load_snapshot(snapshot):
+                self.book.clear()
+                return False
+
+        return True
+
+    def _start_resync(self):
+        if self._fetch_snapshot is None:
+            return
+
+        if not self._resyncing:
+            self._resyncing = True
+            t = threading.Thread(target=self._resync, daemon=True)
+            t.start()
+
+    def _resync(self):
+        while True:
+            snapshot = self._fetch_snapshot()
+
+            with self._lock:
+                if snapshot is not None and self._load_snapshot(snapshot):
+                    self._resyncing = False
+                    return
+
+            logger.warning(f"Binance {self.book.symbol} order book snapshot could not be synchronized, retrying")
+            time.sleep(1)
+
+    def _load_snapshot(self, snapshot: typing.Dict) -> bool:
+        book = self.book
+        book.clear()
+
+        for price, quantity in snapshot['bids']:
+            book.bids.set(float(price), float(quantity))
+        for price, quantity in snapshot['asks']:
+            book.asks.set(float(price), float(quantity))
+
+        book.last_update_id = snapshot['lastUpdateId']
+        book.timestamp = snapshot.get('T')
+        self._awaiting_first = True
+
+        buffer = self._buffer
+        self._buffer = []
+        for data in buffer:
+            if not self._apply(data):
+                return False
+
+        book.synced = True
+        return True
+
+    def _apply(self, data: typing.Dict) -> bool:
+        book = self.book
+
+        if data['u'] < book.last_update_id:
+            return True  # already contained in the snapshot
+
+        if self._awaiting_first:
+            # the first event spans the snapshot id, or starts right after it (pu is the snapshot id)
+            if data['U'] > book.last_update_id and data['pu'] != book.last_update_id:
+                return False  # events between the snapshot and this one were missed
+            self._awaiting_first = False
+        elif data['pu'] != book.last_update_id:
+            return False
+
+        for price, quantity in data['b']:
+            book.bids.set(float(price), float(quantity))
+        for price, quantity in data['a']:
+            book.asks.set(float(price), float(quantity))
+
+        book.last_update_id = data['u']
+        book.timestamp = data['T']
+
+        return True
+
+
+# https://www.bitmex.com/app/wsAPI#OrderBookL2
+# Applies orderBookL2 table changes, the table engine keeps the full row so deletes and updates carry their price
+def apply_bitmex_l2(books: typing.Dict[str, OrderBook], action: str, rows: typing.List[typing.Dict]):
+    if action == "partial":
+        for symbol in set(row['symbol'] for row in rows):
+            if symbol in books:
+                books[symbol].clear()
+
+    for row in rows:
+        book = books.get(row['symbol'])
+        if book is None:
+            continue
+
+        side = book.bids if row['side'] == "Buy" else book.asks
+        side.set(row['price'], 0 if action == "delete" else row['size'])
+
+    if action == "partial":
+        for symbol in set(row['symbol'] for row in rows):
+            if symbol in books:
+                books[symbol].synced = True
@@ -0,0 +1,131 @@
+import math
+import typing
+import threading
+
+import numpy as np
+
+from collections.abc import Mapping
+
+PRICE_FIELDS = ('bid', 'ask', 'bid_size', 'ask_size')
+
+
+# Top of book of every symbol in preallocated arrays: each symbol owns a fixed slot (an integer index) and a
+# tick is a few array writes instead of several dict lookups. A per-slot sequence number works as a seqlock:
+# it is odd while a slot is being written, so readers retry until they get a bid and an ask from the same update.
+# Writers are serialized by a lock: besides the ingest workers, REST calls (get_bid_ask, resyncs after a reconnection)
+# write the same slots, and two interleaved increments could leave a sequence number odd for good.
+class PriceBoard:
+    def __init__(self, symbols: typing.Iterable[str] = (), capacity: int = 64):
+        self._slots = dict()
+        self._symbols = []
+        self._lock = threading.Lock()  # taken by the writers, updates and slot allocations
+
+        symbols = list(symbols)
+        self._allocate(max(capacity, len(symbols)))
+
+        for symbol in symbols:
+            self.slot(symbol)
+
+    def _allocate(self, capacity: int):
+        size = len(self._symbols)
+
+        columns = dict()
+        for name in PRICE_FIELDS:
+            column = np.full(capacity, np.nan, dtype=np.float64)
+            if size > 0:
+                column[:size] = getattr(self, name)[:size]
+            columns[name] = column
+
+        update_time = np.zeros(capacity, dtype=np.int64)
+        seq = np.zeros(capacity, dtype=np.int64)
+        if size > 0:
+            update_time[:size] = self.update_time[:size]
+            seq[:size] = self.seq[:size]
+
+        self.bid = columns['bid']
+        self.ask = columns['ask']
+        self.bid_size = columns['bid_size']
+        self.ask_size = columns['ask_size']
+        self.update_time = update_time  # Unix timestamp in milliseconds of the last update
+        self.seq = seq
+
+    def slot(self, symbol: str) -> int:
+        slot = self._slots.get(symbol)
+        if slot is not None:
+            return slot
+
+        with self._lock:
+            if symbol not in self._slots:
+                if len(self._symbols) == len(self.bid):
+                    self._allocate(len(self.bid) * 2)
+                self._slots[symbol] = len(self._symbols)
+                self._symbols.append(symbol)
+
+        return self._slots[symbol]
+
+    def symbols(self) -> typing.List[str]:
+        return list(self._symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._slots
+
+    def update(self, symbol: str, bid=None, ask=None, bid_size=None, ask_size=None, timestamp: int = 0):
+        # fields left to None keep their previous value
+        i = self.slot(symbol)
+
+        with self._lock:
+            self.seq[i] += 1
+            if bid is not None:
+                self.bid[i] = bid
+            if ask is not None:
+                self.ask[i] = ask
+            if bid_size is not None:
+                self.bid_size[i] = bid_size
+            if ask_size is not None:
+                self.ask_size[i] = ask_size
+            self.update_time[i] = timestamp
+            self.seq[i] += 1
+
+    def snapshot(self, symbol: str) -> typing.Tuple[float, float, float, float, int, int]:
+        # (bid, ask, bid_size, ask_size, update_time, seq) all taken from the same update
+        i = self._slots[symbol]
+
+        while True:
+            seq = int(self.seq[i])
+            if seq % 2 == 0:
+                values = (float(self.bid[i]), float(self.ask[i]), float(self.bid_size[i]), float(self.ask_size[i]),
+                          int(self.update_time[i]))
+                if int(self.seq[i]) == seq:
+                    return values + (seq,)
+
+    def snapshot_all(self) -> typing.Dict[str, np.ndarray]:
+        # copies of every column for all the symbols at once, for vectorized reads
+        while True:
+            n = len(self._symbols)
+            seq = self.seq[:n].copy()
+            columns = {name: getattr(self, name)[:n].copy() for name in PRICE_FIELDS}
+            columns['update_time'] = self.update_time[:n].copy()
+            if not (seq % 2).any() and np.array_equal(seq, self.seq[:n]):
+                columns['seq'] = seq
+                columns['symbols'] = np.array(self._symbols[:n])
+                return columns
+
+
+# The former prices dict-of-dicts, now read from the board: prices[symbol]['bid'] still works
+class PricesView(Mapping):
+    def __init__(self, board: PriceBoard):
+        self._board = board
+
+    def __getitem__(self, symbol: str) -> typing.Dict[str, float]:
+        if symbol not in self._board:
+            raise KeyError(symbol)
+
+        bid, ask = self._board.snapshot(symbol)[:2]
+
+        return {'bid': None if math.isnan(bid) else bid, 'ask': None if math.isnan(ask) else ask}
+
+    def __iter__(self):
+        return iter(self._board.symbols())
+
+    def __len__(self) -> int:
+        return len(self._board.symbols())
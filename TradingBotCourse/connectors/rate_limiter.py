@@ -0,0 +1,242 @@
+import logging
+import time
+import asyncio
+import typing
+import heapq
+import itertools
+import threading
+
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger()
+
+# lower value = served first when several requests wait for budget
+PRIORITY_HIGH = 0  # order placement and cancellation
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2  # candle backfills and other bulk downloads
+
+
+class RateLimitBucket:
+    def __init__(self, name: str, limit: int, window: float):
+        self.name = name
+        self.limit = limit
+        self.window = window  # seconds
+        self.used = 0
+        self.reset_time = 0.0
+
+    def refresh(self, now: float):
+        if now >= self.reset_time:
+            self.used = 0
+            # exchanges count in fixed windows aligned on the clock (every minute, every 10 seconds...)
+            self.reset_time = (now // self.window + 1) * self.window
+
+    def has_room(self, weight: int) -> bool:
+        return self.used + weight <= self.limit
+
+    def sync(self, used: int, now: float):
+        # the exchange count does not include the requests still in flight, which the local count already has:
+        # the larger of the two is kept within the window
+        self.refresh(now)
+        self.used = max(self.used, used, 0)
+
+
+class RateLimiter(ABC):
+    def __init__(self, name: str, buckets: typing.List[RateLimitBucket], weights: typing.Dict[str, typing.Dict]):
+        self._name = name
+        self._buckets = {b.name: b for b in buckets}
+        self._weights = weights  # "METHOD /endpoint" -> {bucket name: weight or function(data) -> weight}
+
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._counter = itertools.count()
+        self._blocked_until = 0.0
+
+    def _request_weights(self, method: str, endpoint: str, data: typing.Dict) -> typing.Dict[str, int]:
+        weights = self._weights.get(f"{method} {endpoint}", self._weights.get("default", dict()))
+
+        request_weights = dict()
+        for bucket_name, weight in weights.items():
+            request_weights[bucket_name] = weight(data) if callable(weight) else weight
+
+        return request_weights
+
+    def _try_take(self, entry: typing.Tuple, request_weights: typing.Dict[str, int]) -> float:
+        # called with the condition held: takes the weights and returns 0 when the request can go, else the time to wait
+        now = time.time()
+        for bucket in self._buckets.values():
+            bucket.refresh(now)
+
+        if self._waiting[0] != entry or now < self._blocked_until:
+            return max(self._blocked_until - now, 0.05)
+
+        full = [self._buckets[b] for b, w in request_weights.items() if not self._buckets[b].has_room(w)]
+        if len(full) > 0:
+            return max(min(b.reset_time for b in full) - now, 0.01)
+
+        heapq.heappop(self._waiting)
+        for bucket_name, weight in request_weights.items():
+            self._buckets[bucket_name].used += weight
+
+        self._condition.notify_all()
+        return 0.0
+
+    def acquire(self, method: str, endpoint: str, data: typing.Dict, priority: int = PRIORITY_NORMAL):
+        request_weights = self._request_weights(method, endpoint, data)
+
+        with self._condition:
+            entry = (priority, next(self._counter))
+            heapq.heappush(self._waiting, entry)
+
+            while True:
+                wait_time = self._try_take(entry, request_weights)
+                if wait_time == 0:
+                    break
+                self._condition.wait(timeout=wait_time)
+
+    async def acquire_async(self, method: str, endpoint: str, data: typing.Dict, priority: int = PRIORITY_NORMAL):
+        # same queue and budget as acquire() for the asyncio clients, the coroutine sleeps instead of blocking the loop
+        request_weights = self._request_weights(method, endpoint, data)
+
+        with self._condition:
+            entry = (priority, next(self._counter))
+            heapq.heappush(self._waiting, entry)
+
+        try:
+            while True:
+                with self._condition:
+                    wait_time = self._try_take(entry, request_weights)
+                if wait_time == 0:
+                    return
+                await asyncio.sleep(wait_time)
+        except asyncio.CancelledError:
+            with self._condition:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                self._condition.notify_all()
+            raise
+
+    @abstractmethod
+    def update_from_headers(self, status_code: int, headers: typing.Mapping):
+        ...
+
+    def _block(self, seconds: float):
+        with self._condition:
+            self._blocked_until = max(self._blocked_until, time.time() + seconds)
+        logger.warning(f"{self._name} rate limit reached, requests paused for {seconds} seconds")
+
+    def metrics(self) -> typing.Dict:
+        with self._condition:
+            now = time.time()
+            metrics = dict()
+            for bucket in self._buckets.values():
+                bucket.refresh(now)
+                metrics[bucket.name] = {'used': bucket.used, 'limit': bucket.limit, 'usage': bucket.used / bucket.limit,
+                                        'reset_in': bucket.reset_time - now}
+            metrics['queued'] = len(self._waiting)
+            metrics['blocked_for'] = max(self._blocked_until - now, 0.0)
+
+        return metrics
+
+
+def _binance_depth_weight(data: typing.Dict) -> int:
+    limit = int(data.get('limit', 500))
+    if limit <= 50:
+        return 2
+    elif limit <= 100:
+        return 5
+    elif limit <= 500:
+        return 10
+    return 20
+
+
+def _binance_klines_weight(data: typing.Dict) -> int:
+    limit = int(data.get('limit', 500))
+    if limit < 100:
+        return 1
+    elif limit < 500:
+        return 2
+    elif limit <= 1000:
+        return 5
+    return 10
+
+
+def _binance_batch_size(data: typing.Dict) -> int:
+    # every order of a batch counts towards the order rate limits
+    return data['batchOrders'].count('"symbol"')
+
+
+# https://binance-docs.github.io/apidocs/futures/en/#limits
+class BinanceRateLimiter(RateLimiter):
+    WEIGHTS = {
+        "default": {'weight_1m': 1},
+        "GET /fapi/v1/exchangeInfo": {'weight_1m': 1},
+        "GET /fapi/v1/account": {'weight_1m': 5},
+        "GET /fapi/v1/klines": {'weight_1m': _binance_klines_weight},
+        "GET /fapi/v1/depth": {'weight_1m': _binance_depth_weight},
+        "GET /fapi/v1/ticker/bookTicker": {'weight_1m': lambda data: 1 if 'symbol' in data else 2},
+        "GET /fapi/v1/order": {'weight_1m': 1},
+        "GET /fapi/v1/openOrders": {'weight_1m': lambda data: 1 if 'symbol' in data else 40},
+        "POST /fapi/v1/order": {'weight_1m': 1, 'orders_10s': 1, 'orders_1m': 1},
+        "DELETE /fapi/v1/order": {'weight_1m': 1},
+        "POST /fapi/v1/batchOrders": {'weight_1m': 5, 'orders_10s': _binance_batch_size, 'orders_1m': _binance_batch_size},
+        "DELETE /fapi/v1/batchOrders": {'weight_1m': 1},
+        "DELETE /fapi/v1/allOpenOrders": {'weight_1m': 1},
+        "POST /fapi/v1/listenKey": {'weight_1m': 1},
+        "PUT /fapi/v1/listenKey": {'weight_1m': 1},
+        "DELETE /fapi/v1/listenKey": {'weight_1m': 1},
+    }
+
+    def __init__(self):
+        buckets = [RateLimitBucket('weight_1m', 2400, 60), RateLimitBucket('orders_10s', 300, 10),
+                   RateLimitBucket('orders_1m', 1200, 60)]
+        super().__init__("Binance", buckets, self.WEIGHTS)
+
+    def update_from_headers(self, status_code: int, headers: typing.Mapping):
+        now = time.time()
+
+        with self._condition:
+            if 'X-MBX-USED-WEIGHT-1M' in headers:
+                self._buckets['weight_1m'].sync(int(headers['X-MBX-USED-WEIGHT-1M']), now)
+            if 'X-MBX-ORDER-COUNT-10S' in headers:
+                self._buckets['orders_10s'].sync(int(headers['X-MBX-ORDER-COUNT-10S']), now)
+            if 'X-MBX-ORDER-COUNT-1M' in headers:
+                self._buckets['orders_1m'].sync(int(headers['X-MBX-ORDER-COUNT-1M']), now)
+            self._condition.notify_all()
+
+        # 429 = too many requests, 418 = IP banned after ignoring 429s
+        if status_code in (418, 429):
+            self._block(float(headers.get('Retry-After', 60)))
+
+
+# https://www.bitmex.com/app/restAPI#Limits
+class BitmexRateLimiter(RateLimiter):
+    WEIGHTS = {
+        "default": {'requests_1m': 1},
+        "POST /api/v1/order": {'requests_1m': 1, 'orders_1s': 1},
+        "DELETE /api/v1/order": {'requests_1m': 1, 'orders_1s': 1},
+        "POST /api/v1/order/bulk": {'requests_1m': 1, 'orders_1s': 1},
+        "DELETE /api/v1/order/all": {'requests_1m': 1, 'orders_1s': 1},
+    }
+
+    def __init__(self):
+        buckets = [RateLimitBucket('requests_1m', 120, 60), RateLimitBucket('orders_1s', 10, 1)]
+        super().__init__("Bitmex", buckets, self.WEIGHTS)
+
+    def update_from_headers(self, status_code: int, headers: typing.Mapping):
+        now = time.time()
+
+        with self._condition:
+            if 'x-ratelimit-remaining' in headers:
+                bucket = self._buckets['requests_1m']
+                bucket.limit = int(headers.get('x-ratelimit-limit', bucket.limit))
+                bucket.sync(bucket.limit - int(headers['x-ratelimit-remaining']), now)
+                if 'x-ratelimit-reset' in headers:
+                    bucket.reset_time = float(headers['x-ratelimit-reset'])
+            if 'x-ratelimit-remaining-1s' in headers:
+                bucket = self._buckets['orders_1s']
+                bucket.sync(bucket.limit - int(headers['x-ratelimit-remaining-1s']), now)
+            self._condition.notify_all()
+
+        if status_code == 429:
+            self._block(float(headers.get('Retry-After', 1)))
@@ -0,0 +1,181 @@
+import logging
+import os
+import time
+import typing
+import glob
+import struct
+import zlib
+import queue
+
+import threading
+
+logger = logging.getLogger()
+
+# A tape file starts with TAPE_MAGIC and is then a sequence of chunks, each one is a CHUNK_HEADER
+# (compressed size, record count) followed by the zlib compressed records. A record is a RECORD_HEADER
+# (receive time, source name size, frame size), the source name and the raw frame, both UTF-8.
+TAPE_MAGIC = b"TBCTAPE1"
+CHUNK_HEADER = struct.Struct("<II")
+RECORD_HEADER = struct.Struct("<dBI")
+TAPE_EXTENSION = ".tape"
+
+
+# Writes the raw websocket frames of one or several clients to disk. record() only puts the frame in a queue,
+# a background thread groups the frames in chunks, compresses them, rotates the files and fsyncs in batches.
+class TapeRecorder:
+    def __init__(self, directory: str, prefix: str = "tape", chunk_size: int = 1024 * 1024, compression_level: int = 6,
+                 max_file_size: int = 256 * 1024 * 1024, rotate_interval: float = 3600.0, flush_interval: float = 1.0,
+                 max_queue: int = 100000):
+        self.directory = directory
+        self.prefix = prefix
+
+        self._chunk_size = chunk_size  # uncompressed bytes per chunk
+        self._compression_level = compression_level
+        self._max_file_size = max_file_size
+        self._rotate_interval = rotate_interval
+        self._flush_interval = flush_interval  # seconds between two chunk writes + fsync when the feed is slow
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._file = None
+        self._file_opened_at = None
+        self._file_index = 0
+
+        self._records = 0
+        self._dropped = 0
+        self._raw_bytes = 0
+        self._written_bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def record(self, source: str, msg, receive_time=None):
+        # called on the websocket reader threads, a full queue drops the frame instead of slowing them down
+        try:
+            self._queue.put_nowait((receive_time if receive_time is not None else time.time(), source, msg))
+        except queue.Full:
+            self._dropped += 1
+
+    def close(self):
+        self._running = False
+        self._queue.put(None)
+        self._thread.join()
+
+    def metrics(self) -> typing.Dict:
+        return {'records': self._records, 'dropped': self._dropped, 'queued': self._queue.qsize(),
+                'raw_bytes': self._raw_bytes, 'written_bytes': self._written_bytes, 'files': self._file_index}
+
+    def _run(self):
+        buffer = bytearray()
+        count = 0
+        last_flush = time.time()
+
+        while True:
+            timeout = max(self._flush_interval - (time.time() - last_flush), 0.001)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+
+            if item:
+                receive_time, source, msg = item
+                source = source.encode()
+                frame = msg.encode() if isinstance(msg, str) else msg
+
+                buffer += RECORD_HEADER.pack(receive_time, len(source), len(frame))
+                buffer += source
+                buffer += frame
+                count += 1
+
+            stop = item is None
+            if len(buffer) >= self._chunk_size or (count > 0 and (stop or time.time() - last_flush >= self._flush_interval)):
+                try:
+                    self._write_chunk(buffer, count)
+                except Exception as e:
+                    logger.error(f"Tape recorder error while writing {count} records: {e}")
+                buffer = bytearray()
+                count = 0
+
+            if stop or time.time() - last_flush >= self._flush_interval:
+                self._sync()
+                last_flush = time.time()
+
+            if stop:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _write_chunk(self, buffer: bytearray, count: int):
+        if self._file is None or self._file.tell() >= self._max_file_size or \
+                time.time() - self._file_opened_at >= self._rotate_interval:
+            self._rotate()
+
+        data = zlib.compress(bytes(buffer), self._compression_level)
+        self._file.write(CHUNK_HEADER.pack(len(data), count))
+        self._file.write(data)
+
+        self._records += count
+        self._raw_bytes += len(buffer)
+        self._written_bytes += CHUNK_HEADER.size + len(data)
+
+    def _sync(self):
+        # one fsync per flush interval instead of one per chunk
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _rotate(self):
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+
+        self._file_index += 1
+        name = f"{self.prefix}-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{self._file_index:04d}{TAPE_EXTENSION}"
+
+        self._file = open(os.path.join(self.directory, name), "wb")
+        self._file.write(TAPE_MAGIC)
+        self._file_opened_at = time.time()
+
+
+def read_tape(path: str) -> typing.Iterator[typing.Tuple[float, str, str]]:
+    # yields (receive time, source, frame), a chunk cut by a crash ends the file
+    with open(path, "rb") as f:
+        if f.read(len(TAPE_MAGIC)) != TAPE_MAGIC:
+            logger.error(f"{path} is not a tape file")
+            return
+
+        while True:
+            header = f.read(CHUNK_HEADER.size)
+            if len(header) < CHUNK_HEADER.size:
+                return
+
+            size, count = CHUNK_HEADER.unpack(header)
+            data = f.read(size)
+            if len(data) < size:
+                logger.warning(f"{path} ends with an incomplete chunk of {count} records")
+                return
+
+            data = zlib.decompress(data)
+            offset = 0
+            for _ in range(count):
+                receive_time, source_size, frame_size = RECORD_HEADER.unpack_from(data, offset)
+                offset += RECORD_HEADER.size
+                source = data[offset:offset + source_size].decode()
+                offset += source_size
+                frame = data[offset:offset + frame_size].decode()
+                offset += frame_size
+
+                yield receive_time, source, frame
+
+
+def tape_files(directory: str, prefix: str = "tape") -> typing.List[str]:
+    # the file names sort in recording order
+    return sorted(glob.glob(os.path.join(directory, f"{prefix}-*{TAPE_EXTENSION}")))
+
+
+def read_tapes(paths: typing.Iterable[str]) -> typing.Iterator[typing.Tuple[float, str, str]]:
+    for path in paths:
+        yield from read_tape(path)
@@ -0,0 +1,72 @@
+import logging
+import time
+import typing
+
+from connectors.recorder import read_tapes, tape_files
+
+logger = logging.getLogger()
+
+SPEED_REALTIME = 1.0
+SPEED_MAX = None  # as fast as possible
+
+
+# Feeds recorded frames back through the clients' _on_message, in the order of the tape. The clients should be
+# created with subscribe_all_contracts=False (and user_data_stream=False for Binance) so that no live market data
+# is mixed with the tape. The frames of one symbol/table are processed in order by the same ingest worker, the
+# Binance books are loaded from the recorded snapshots, the candle histories from the ones recorded by
+# subscribe_candles() and the bars are closed by the replayed timestamps, so the final prices, books and candles
+# only depend on the tape, not on the speed. Subscribe the candles after creating the TapeReplayer, they then
+# start empty instead of downloading the current history.
+class TapeReplayer:
+    def __init__(self, clients: typing.List, speed=SPEED_REALTIME):
+        self.speed = speed  # 1.0 real time, 10.0 ten times faster, SPEED_MAX without any wait
+
+        self._clients = clients
+        self._targets = dict()  # source name recorded in the tape -> function(frame)
+        for client in clients:
+            self._targets.update(client.replay_targets())
+
+        self.frames = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+
+    def replay(self, records: typing.Iterable[typing.Tuple[float, str, str]]) -> int:
+        start = time.perf_counter()
+        first_time = None
+
+        for receive_time, source, frame in records:
+            target = self._targets.get(source)
+            if target is None:
+                self.skipped += 1
+                continue
+
+            if self.speed:
+                if first_time is None:
+                    first_time = receive_time
+
+                # wait until the same time has passed since the first frame as during the recording
+                wait = (receive_time - first_time) / self.speed - (time.perf_counter() - start)
+                if wait > 0:
+                    time.sleep(wait)
+
+            try:
+                target(frame)
+            except Exception as e:
+                logger.error(f"Error while replaying a {source} frame: {e}")
+
+            self.frames += 1
+
+        for client in self._clients:
+            client.wait_ingest()
+
+        self.elapsed = time.perf_counter() - start
+        logger.info(f"Replayed {self.frames} frames in {self.elapsed:.2f} seconds ({self.skipped} skipped)")
+
+        return self.frames
+
+    def replay_directory(self, directory: str, prefix: str = "tape") -> int:
+        return self.replay(read_tapes(tape_files(directory, prefix)))
+
+    def metrics(self) -> typing.Dict:
+        return {'frames': self.frames, 'skipped': self.skipped, 'elapsed': self.elapsed,
+                'frame_rate': self.frames / self.elapsed if self.elapsed > 0 else None}
@@ -0,0 +1,53 @@
+import typing
+import threading
+
+
+# Websocket subscriptions shared by several consumers (strategies, UI watchlist, recorder...): a stream stays
+# subscribed while at least one consumer holds it, and the set of active streams is what gets replayed on reconnect
+class SubscriptionRegistry:
+    def __init__(self):
+        self._consumers = dict()  # stream -> set of consumer names
+        self._lock = threading.Lock()
+
+    def acquire(self, streams: typing.List[str], consumer: str) -> typing.List[str]:
+        # returns the streams that were not subscribed yet and must be subscribed now
+        new_streams = []
+
+        with self._lock:
+            for stream in streams:
+                if stream not in self._consumers:
+                    self._consumers[stream] = set()
+                    new_streams.append(stream)
+                self._consumers[stream].add(consumer)
+
+        return new_streams
+
+    def release(self, streams: typing.List[str], consumer: str) -> typing.List[str]:
+        # returns the streams nobody needs anymore and that can be unsubscribed
+        released = []
+
+        with self._lock:
+            for stream in streams:
+                consumers = self._consumers.get(stream)
+                if consumers is None:
+                    continue
+                consumers.discard(consumer)
+                if len(consumers) == 0:
+                    del self._consumers[stream]
+                    released.append(stream)
+
+        return released
+
+    def release_all(self, consumer: str) -> typing.List[str]:
+        with self._lock:
+            streams = [stream for stream, consumers in self._consumers.items() if consumer in consumers]
+
+        return self.release(streams, consumer)
+
+    def consumers(self, stream: str) -> typing.Set[str]:
+        with self._lock:
+            return set(self._consumers.get(stream, set()))
+
+    def active(self) -> typing.List[str]:
+        with self._lock:
+            return list(self._consumers)
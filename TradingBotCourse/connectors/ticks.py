@@ -0,0 +1,155 @@
+import math
+import typing
+
+import numpy as np
+
+from decimal import Decimal
+
+ROUND_NEAREST = "nearest"
+ROUND_FLOOR = "floor"  # towards -inf: a lower price, a smaller quantity
+ROUND_CEIL = "ceil"
+
+# x * step is considered already on the grid when it is that close to a whole number of steps, so that 0.3 with a
+# 0.1 tick (2.9999999999999996 steps in floats) is not floored to 0.2
+GRID_TOLERANCE = 1e-9
+
+
+def round_half_away(steps: float) -> int:
+    # nearest int, ties away from zero like the exchanges and from_wire(), where round() would give -0.5 -> 0
+    ticks = math.floor(abs(steps))
+    if abs(steps) - ticks >= 0.5:
+        ticks += 1
+    return -ticks if steps < 0 else ticks
+
+
+def round_half_away_array(steps: np.ndarray) -> np.ndarray:
+    magnitude = np.abs(steps)
+    ticks = np.floor(magnitude)
+    ticks = np.where(magnitude - ticks >= 0.5, ticks + 1, ticks)
+    return np.copysign(ticks, steps)
+
+
+def step_decimals(step) -> int:
+    # number of decimals of a tick or lot size given as a float, a string or a Decimal: 0.5 -> 1, 100 -> 0, 1e-08 -> 8
+    exponent = Decimal(repr(step) if isinstance(step, float) else str(step)).normalize().as_tuple().exponent
+    return max(-exponent, 0)
+
+
+# Fixed-point representation of the prices (or quantities) of one contract: a value is an int number of steps, the
+# step being the tick size (or lot size). Ticks add, subtract and compare exactly and without any allocation for the
+# usual sizes (small ints), the conversions to and from the exchange strings go through integers only.
+#   step = units / 10 ** decimals, e.g. a 0.5 tick is 5 / 10 ** 1, a 100 lot is 100 / 10 ** 0
+class TickScale:
+    __slots__ = ('step', 'decimals', 'units', '_power', '_per_value')
+
+    def __init__(self, step):
+        self.decimals = step_decimals(step)
+        self._power = 10 ** self.decimals
+        self.units = int(Decimal(repr(step) if isinstance(step, float) else str(step)).scaleb(self.decimals))
+        self.step = self.units / self._power
+        self._per_value = self._power / self.units  # steps per 1.0, precomputed for the rounding functions
+
+    @classmethod
+    def from_decimals(cls, decimals: int):
+        # a step of one unit of the last decimal, what a Binance pricePrecision / quantityPrecision describes
+        return cls(Decimal(1).scaleb(-decimals))
+
+    def __repr__(self) -> str:
+        return f"TickScale({self.to_wire(1)})"
+
+    def to_ticks(self, value: typing.Union[float, int, str]) -> int:
+        # nearest number of steps, strings (the wire format) are converted without going through a float
+        if isinstance(value, str):
+            return self.from_wire(value)
+
+        return round_half_away(value * self._power / self.units)
+
+    def to_float(self, ticks: int) -> float:
+        # the int division is correctly rounded: the float nearest to the exact decimal value
+        return ticks * self.units / self._power
+
+    def from_wire(self, text: str) -> int:
+        # "27123.5" -> 54247 for a 0.5 tick, the value is rounded half away from zero to a whole number of steps
+        text = text.strip()
+        negative = text.startswith("-")
+        if negative or text.startswith("+"):
+            text = text[1:]
+
+        if "e" in text or "E" in text:
+            text = format(Decimal(text), "f")
+
+        whole, _, fraction = text.partition(".")
+        fraction = fraction.rstrip("0")
+
+        # value / step = digits / 10 ** len(fraction) * 10 ** decimals / units, rounded once: a value with more
+        # decimals than the step (a computed price sent back by the exchange) is not rounded to them first
+        numerator = int(whole + fraction or "0") * self._power
+        denominator = self.units * 10 ** len(fraction)
+
+        ticks, remainder = divmod(numerator, denominator)
+        if 2 * remainder >= denominator:
+            ticks += 1
+
+        return -ticks if negative else ticks
+
+    def to_wire(self, ticks: int) -> str:
+        # exact decimal string with the decimals of the step: 54247 -> "27123.5" for a 0.5 tick
+        scaled = ticks * self.units
+        sign = "-" if scaled < 0 else ""
+        whole, fraction = divmod(abs(scaled), self._power)
+
+        if self.decimals == 0:
+            return f"{sign}{whole}"
+
+        return f"{sign}{whole}.{fraction:0{self.decimals}d}"
+
+    def round_ticks(self, value: float, mode: str = ROUND_NEAREST) -> int:
+        steps = value * self._per_value
+        nearest = round_half_away(steps)
+        if mode == ROUND_NEAREST or abs(steps - nearest) <= GRID_TOLERANCE * max(abs(steps), 1.0):
+            return nearest
+
+        return math.floor(steps) if mode == ROUND_FLOOR else math.ceil(steps)
+
+    def round(self, value: float, mode: str = ROUND_NEAREST) -> float:
+        return self.to_float(self.round_ticks(value, mode))
+
+    def format(self, value: float, mode: str = ROUND_NEAREST) -> str:
+        return self.to_wire(self.round_ticks(value, mode))
+
+    def round_ticks_array(self, values, mode: str = ROUND_NEAREST) -> np.ndarray:
+        # the same rounding for a whole ladder of prices or quantities at once, as int64 ticks
+        steps = np.asarray(values, dtype=np.float64) * self._per_value
+        nearest = round_half_away_array(steps)
+        if mode != ROUND_NEAREST:
+            on_grid = np.abs(steps - nearest) <= GRID_TOLERANCE * np.maximum(np.abs(steps), 1.0)
+            nearest = np.where(on_grid, nearest, np.floor(steps) if mode == ROUND_FLOOR else np.ceil(steps))
+
+        return nearest.astype(np.int64)
+
+    def round_array(self, values, mode: str = ROUND_NEAREST) -> np.ndarray:
+        return self.round_ticks_array(values, mode) * self.units / self._power
+
+
+# Rounding of order prices and quantities shared by the Contract models, which set price_scale and quantity_scale.
+# Quantities are floored by default so that an order is never bigger than what was asked.
+class ContractRounding:
+    __slots__ = ()
+
+    def round_price(self, price: float, mode: str = ROUND_NEAREST) -> float:
+        return self.price_scale.round(price, mode)
+
+    def round_quantity(self, quantity: float, mode: str = ROUND_FLOOR) -> float:
+        return self.quantity_scale.round(quantity, mode)
+
+    def round_prices(self, prices, mode: str = ROUND_NEAREST) -> np.ndarray:
+        return self.price_scale.round_array(prices, mode)
+
+    def round_quantities(self, quantities, mode: str = ROUND_FLOOR) -> np.ndarray:
+        return self.quantity_scale.round_array(quantities, mode)
+
+    def format_price(self, price: float, mode: str = ROUND_NEAREST) -> str:
+        return self.price_scale.format(price, mode)
+
+    def format_quantity(self, quantity: float, mode: str = ROUND_FLOOR) -> str:
+        return self.quantity_scale.format(quantity, mode)
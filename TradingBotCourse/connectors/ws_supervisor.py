@@ -0,0 +1,148 @@
+import logging
+import time
+import typing
+import random
+
+import websocket
+
+from connectors.latency import RollingHistogram
+
+import threading
+
+logger = logging.getLogger()
+
+WS_BASE_DELAY = 1.0
+WS_MAX_DELAY = 60.0
+WS_STALE_TIMEOUT = 30.0  # seconds without any data before a connection is considered dead
+WS_STABLE_AFTER = 30.0  # a connection that lasted this long resets the backoff
+
+
+def backoff_delay(attempt: int, base_delay: float = WS_BASE_DELAY, max_delay: float = WS_MAX_DELAY) -> float:
+    # "equal jitter": at least half of the exponential delay plus a random part, so that the clients disconnected
+    # by the same incident do not all come back at the same moment
+    delay = min(max_delay, base_delay * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+# Keeps one websocket connection alive: reconnects with jittered exponential backoff and forces a reconnection
+# when the connection is open but no data arrived for stale_timeout seconds. on_open is expected to replay the subscriptions,
+# on_reconnect runs in its own thread after every reconnection to resynchronize state through REST.
+# expects_data tells whether the connection currently carries streams that should keep sending data: without any,
+# silence is normal (the pings keep checking the connection itself) and the staleness check is skipped.
+class WebsocketSupervisor:
+    def __init__(self, name: str, url, on_open: typing.Callable, on_message: typing.Callable, on_reconnect=None,
+                 base_delay: float = WS_BASE_DELAY, max_delay: float = WS_MAX_DELAY, stale_timeout=WS_STALE_TIMEOUT,
+                 ping_interval: float = 20.0, stable_after: float = WS_STABLE_AFTER, expects_data=None):
+        self.name = name
+        self.connected = False
+        self.ws = None
+
+        self._url = url  # string or function returning the url, for urls that change between connections
+        self._on_open = on_open
+        self._on_message = on_message
+        self._on_reconnect = on_reconnect
+
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._stale_timeout = stale_timeout  # None disables the staleness check (quiet streams)
+        self._expects_data = expects_data  # function() -> bool, None when data is always expected
+        self._ping_interval = ping_interval
+        self._stable_after = stable_after
+
+        self._running = False
+        self._connections = 0
+        self._opened_at = None
+        self.last_message_time = None
+        self.reconnects = 0
+        self.ping_rtt = RollingHistogram(1000)  # ms between our ping frames and the exchange pongs
+
+    def start(self):
+        self._running = True
+
+        t = threading.Thread(target=self._run, daemon=True)
+        t.start()
+
+        if self._stale_timeout is not None:
+            t = threading.Thread(target=self._watch_staleness, daemon=True)
+            t.start()
+
+    def stop(self):
+        self._running = False
+        if self.ws is not None:
+            self.ws.close()
+
+    def send(self, msg: str):
+        self.ws.send(msg)
+
+    def _run(self):
+        attempt = 0
+
+        while self._running:
+            url = self._url() if callable(self._url) else self._url
+            self.ws = websocket.WebSocketApp(url, on_open=self._handle_open, on_close=self._handle_close,
+                                             on_error=self._handle_error, on_message=self._handle_message,
+                                             on_pong=self._handle_pong)
+            self._opened_at = None
+
+            try:
+                self.ws.run_forever(ping_interval=self._ping_interval, ping_timeout=self._ping_interval / 2)
+            except Exception as e:
+                logger.error(f"{self.name} error in run_forever() method: {e}")
+
+            self.connected = False
+            if not self._running:
+                return
+
+            if self._opened_at is not None and time.time() - self._opened_at >= self._stable_after:
+                attempt = 0
+
+            delay = backoff_delay(attempt, self._base_delay, self._max_delay)
+            attempt += 1
+
+            logger.warning(f"{self.name} reconnecting in {delay:.1f} seconds")
+            time.sleep(delay)
+
+    def _watch_staleness(self):
+        while self._running:
+            time.sleep(1)
+
+            if self._expects_data is not None and not self._expects_data():
+                # the timeout starts again from the first subscription
+                self.last_message_time = time.time()
+                continue
+
+            if self.connected and self.last_message_time is not None and time.time() - self.last_message_time > self._stale_timeout:
+                logger.warning(f"{self.name} received no data for {self._stale_timeout} seconds, reconnecting")
+                self.last_message_time = None
+                self.ws.close()
+
+    def _handle_open(self, ws):
+        logger.info(f"{self.name} websocket connection opened")
+
+        self.connected = True
+        self._opened_at = time.time()
+        self.last_message_time = self._opened_at
+        self._connections += 1
+
+        self._on_open(ws)
+
+        if self._connections > 1:
+            self.reconnects += 1
+            if self._on_reconnect is not None:
+                t = threading.Thread(target=self._on_reconnect, daemon=True)
+                t.start()
+
+    def _handle_close(self, ws, *args):
+        logger.warning(f"{self.name} websocket connection closed")
+        self.connected = False
+
+    def _handle_error(self, ws, msg):
+        logger.error(f"{self.name} websocket connection error: {msg}")
+
+    def _handle_pong(self, ws, data):
+        if ws.last_ping_tm and ws.last_pong_tm >= ws.last_ping_tm:
+            self.ping_rtt.add((ws.last_pong_tm - ws.last_ping_tm) * 1000)
+
+    def _handle_message(self, ws, msg: str):
+        self.last_message_time = time.time()
+        self._on_message(ws, msg)